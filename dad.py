@@ -1,3 +1,4 @@
+import asyncio
 from collections import defaultdict
 import datetime
 import discord
@@ -11,14 +12,19 @@ from redbot.core.data_manager import cog_data_path
 from redbot.core.bot import Red
 from typing import List, Tuple
 
-from .images import random_image_url_in_category
+from .guild_settings import GuildSettingsCache
+from .images import check_image_health, close_session, \
+        reload_if_changed, set_backup_dir
 from .jokes.canceled import CanceledJoke
 from .jokes.chores import ChoreJoke
 from .jokes.cowsay import CowSayJoke
 from .jokes.favoritism import FavoritismJoke
 from .jokes.joke import Joke, NoSuchOption
 from .jokes.thats_fair import ThatsFairJoke
-from .jokes.util import OptionType
+from .jokes.triggers import TriggerIndex
+from .jokes.util import OptionType, set_embed_image
+from .points_ledger import PointsLedger
+from .standings import Leaderboard, Standings
 from .version import __version__, Version
 
 
@@ -29,13 +35,19 @@ _DEFAULT_GLOBAL = {
         "https://www.youtube.com/watch?v=A5U8ypHq3BU",
     "new_day_gmt_hour_start": 12,
     "last_rolled_clip_date": None,
-    "last_unrolled_clip_date": None}
+    "last_unrolled_clip_date": None,
+    "image_backup_dir": None}
 _DEFAULT_GUILD = {
     "favorite_child": None,
     "hated_child": None,
     "fair_child": None,
     "flat_fuck_img_change": False}
 _DEFAULT_MEMBER = {"points": 0, "cancel_counter": 0}
+# Number of members shown on each page of the rankings
+_LEADERBOARD_PAGE_SIZE = 25
+# The event loop only weakly references tasks, so those left running after
+# an unload are kept here until they finish
+_BACKGROUND_TASKS = set()
 
 
 class Dad(commands.Cog):
@@ -55,9 +67,11 @@ class Dad(commands.Cog):
         # Register jokes
         self.jokes = jokes
         self.guild_options_information = dict()
+        self.trigger_index = TriggerIndex()
         for jk in self.jokes.values():
             jk.register_guild_settings(_DEFAULT_GUILD, 
                     self.guild_options_information)
+            jk.register_triggers(self.trigger_index)
 
         self._conf = Config.get_conf(
                 None, 91919191, 
@@ -66,6 +80,12 @@ class Dad(commands.Cog):
         self._conf.register_global(**_DEFAULT_GLOBAL)
         self._conf.register_guild(**_DEFAULT_GUILD)
         self._conf.register_member(**_DEFAULT_MEMBER)
+        # In memory copy of every guild's settings, warmed in on_ready
+        self.guild_settings = GuildSettingsCache(self._conf, _DEFAULT_GUILD)
+        # Member points changes, written in batches by flush_points_loop
+        self.points_ledger = PointsLedger(self._conf, _DEFAULT_MEMBER)
+        # Favorite and hated children of each guild
+        self.standings = Standings(self.points_ledger)
         self.shut_up_until = defaultdict(lambda: None)
         # Dad Presence Data
         self.dad_presences = [
@@ -101,6 +121,32 @@ class Dad(commands.Cog):
         # Start the task loops
         self.roll_the_clip_loop.start()
         self.unroll_the_clip_loop.start()
+        self.flush_points_loop.start()
+        self.image_health_loop.start()
+        self.image_database_watch_loop.start()
+
+
+    def cog_unload(self):
+        """Stop the task loops and save the unwritten points.
+        Red calls this without awaiting it, so the saving is left to a task.
+        """
+        self.roll_the_clip_loop.cancel()
+        self.unroll_the_clip_loop.cancel()
+        self.flush_points_loop.cancel()
+        self.image_health_loop.cancel()
+        self.image_database_watch_loop.cancel()
+        task = asyncio.create_task(self._finish_unload())
+        _BACKGROUND_TASKS.add(task)
+        task.add_done_callback(_BACKGROUND_TASKS.discard)
+
+
+    async def _finish_unload(self):
+        """Write the unwritten points, and close the image session"""
+        try:
+            await self.points_ledger.flush()
+        except Exception as e:
+            LOG.error(f"Points Flush: Failure on unload -> {e}")
+        await close_session()
 
 
     # Helper commands
@@ -217,6 +263,17 @@ class Dad(commands.Cog):
     # Listeners
     @commands.Cog.listener()
     async def on_member_join(self, member:discord.Member):
+        # Those who come back keep their points, so put them back in the
+        # standings, bots can't be children
+        if not member.bot:
+            standings = await self.standings.get(member.guild)
+            standings.points.update(member.id,
+                    await self.points_ledger.get(member))
+            standings.cancel_counters.update(member.id,
+                    await self._conf.member(member).cancel_counter())
+            await FavoritismJoke.calculate_favoritism_in_guild(self,
+                    member.guild)
+
         # Get system channel (default channel for system messages like new 
         # members)
         sys_chan = member.guild.system_channel
@@ -279,8 +336,9 @@ class Dad(commands.Cog):
             return
 
         # Does Dad notice the joke?
-        for jk in random.sample(list(self.jokes.values()), 
-                len(self.jokes)):
+        # Only the jokes whose triggers appear in the message are attempted
+        candidates = self.trigger_index.candidates(msg.content)
+        for jk in random.sample(candidates, len(candidates)):
             if await jk.make_verbal_joke(self, msg):
                 # Reward user for allowing a joke to occur
                 await FavoritismJoke.add_points_to_member(
@@ -323,8 +381,24 @@ class Dad(commands.Cog):
                 break
 
 
+    @commands.Cog.listener()
+    async def on_member_remove(self, member:discord.Member):
+        # Those who leave can't be the favorite, or the hated, child
+        standings = await self.standings.get(member.guild)
+        standings.remove(member.id)
+        await FavoritismJoke.calculate_favoritism_in_guild(self, member.guild)
+
+
+    @commands.Cog.listener()
+    async def on_guild_remove(self, guild:discord.Guild):
+        # Don't keep the settings of guilds Dad is no longer in
+        self.guild_settings.forget(guild)
+        self.standings.forget(guild)
+
+
     @commands.Cog.listener()
     async def on_ready(self):
+        await self.guild_settings.warm(guild.id for guild in self.bot.guilds)
         await self.set_random_dad_presence()
 
 
@@ -364,10 +438,9 @@ class Dad(commands.Cog):
             # Report to each guild
             informed_guild_names = []
             for guild in self.bot.guilds:
-                upgrades_image = random_image(UPGRADES_DIR)
                 guild_embed = discord.Embed.from_dict(guild_contents)
-                guild_embed.set_image(
-                        url=random_image_url_in_category("upgrades"))
+                upgrades_image = await set_embed_image(guild_embed,
+                        "upgrades", guild.id)
                 if guild.system_channel:
                     await guild.system_channel.send(
                             embed=guild_embed, file=upgrades_image)
@@ -394,7 +467,7 @@ class Dad(commands.Cog):
             If the last word is a valid cowsay character it will
             dictate the cow to use, otherwise it will be the "default".
         """
-        if words[-1] in CowSayJoke.cowsay_characters():
+        if words and CowSayJoke.is_cowsay_character(words[-1]):
             character = words[-1]
             text = " ".join(words[0:-1])
         else:
@@ -402,7 +475,7 @@ class Dad(commands.Cog):
             text = " ".join(words)
 
         await ctx.channel.send(
-                CowSayJoke.construct_cowsay(character, text))
+                await CowSayJoke.construct_cowsay(character, text))
 
 
     @commands.command()
@@ -416,26 +489,69 @@ class Dad(commands.Cog):
         await ctx.send(embed=discord.Embed.from_dict(contents))
 
 
+    async def send_leaderboard_page(self, ctx:commands.Context,
+            leaderboard:Leaderboard, title:str, page:int) -> None:
+        """Send a page of a leaderboard as an embed.
+
+        Parameters
+        ----------
+        ctx: commands.Context
+            The context to send the page to.
+        leaderboard: Leaderboard
+            The leaderboard to send a page of.
+        title: str
+            The title of the embed.
+        page: int
+            The page to send, starting from 1.
+        """
+        page_count = max(1, -(-len(leaderboard) // _LEADERBOARD_PAGE_SIZE))
+        page = min(max(1, page), page_count)
+        # Turn into formatted strings
+        lines = []
+        for member_id, value in leaderboard.page(page, _LEADERBOARD_PAGE_SIZE):
+            member = ctx.guild.get_member(member_id)
+            if member is not None:
+                lines.append(f"{member.display_name}: {value}")
+        # Send the results
+        contents = dict(
+                title = title,
+                description = "\n".join(lines),
+                footer = {"text": f"Page {page}/{page_count}"}
+                )
+        await ctx.send(embed=discord.Embed.from_dict(contents))
+
+
     @commands.guild_only()
     @commands.command(aliases=["rankings"])
-    async def ranking(self, ctx:commands.Context):
+    async def ranking(self, ctx:commands.Context, page:int=1):
         """What are the points assigned to all the users?
+
+        Parameters
+        ----------
+        page: int
+            The page of the rankings to show.
         """
-        # Sort members by points
-        sorted_members = list(sorted(
-                [(await self._conf.member(member).points(), member) for 
-                    member in ctx.guild.members],
-                key=lambda pair: -pair[0]
-            ))
-        # Turn into formatted strings
-        rankings = []
-        for points, member in sorted_members:
-            if not member.bot:
-                rankings.append(f"{member.display_name}: {points}")
-        # Send the results
+        standings = await self.standings.get(ctx.guild)
+        await self.send_leaderboard_page(ctx, standings.points,
+                "My Children's Rankings", page)
+
+
+    @commands.guild_only()
+    @commands.command()
+    async def my_rank(self, ctx:commands.Context):
+        """Where do you rank among Dad's children?
+        """
+        standings = await self.standings.get(ctx.guild)
+        rank = standings.points.rank(ctx.author.id)
+        points = standings.points.value(ctx.author.id)
+        if rank is None:
+            description = f"{ctx.author.mention}, you have no points."
+        else:
+            description = f"{ctx.author.mention}, you are number {rank} of "\
+                    f"{len(standings.points)} with {points} points."
         contents = dict(
-                title = "My Children's Rankings",
-                description = "\n".join(rankings)
+                title = "Your Ranking",
+                description = description
                 )
         await ctx.send(embed=discord.Embed.from_dict(contents))
 
@@ -446,7 +562,7 @@ class Dad(commands.Cog):
         """Who is Dad's favorite child (in this server)?
         """
         # Get the id number
-        fav_id = await self._conf.guild(ctx.guild).favorite_child()
+        fav_id = await self.guild_settings.get(ctx.guild, "favorite_child")
         # Find the member with the specified id number
         if fav_id is None:
             await ctx.channel.send("None of you are worth my love.")
@@ -462,7 +578,7 @@ class Dad(commands.Cog):
         """Who is Dad's most hated child (in this server)?
         """
         # Get the id number
-        hate_id = await self._conf.guild(ctx.guild).hated_child()
+        hate_id = await self.guild_settings.get(ctx.guild, "hated_child")
         # Find the member with the specified id number
         if hate_id is None:
             await ctx.channel.send("I don't hate any of my children.")
@@ -515,26 +631,17 @@ class Dad(commands.Cog):
     @commands.command(aliases=["cancel_counters", 
         "cancel_counter", "canceled_counter",
         "canceled_count", "cancel_count"])
-    async def canceled_counters(self, ctx:commands.Context):
-        """Cancel counter for everyone"""
-        # Sort members by points
-        sorted_members = list(sorted(
-                [(await self._conf.member(member).\
-                        cancel_counter(), member) for 
-                    member in ctx.guild.members],
-                key=lambda pair: -pair[0]
-            ))
-        # Turn into formatted strings
-        cancel_counters = []
-        for counter, member in sorted_members:
-            if not member.bot:
-                cancel_counters.append(f"{member.display_name}: {counter}")
-        # Send the results
-        contents = dict(
-                title = "How Many Cancellations",
-                description = "\n".join(cancel_counters)
-                )
-        await ctx.send(embed=discord.Embed.from_dict(contents))
+    async def canceled_counters(self, ctx:commands.Context, page:int=1):
+        """Cancel counter for everyone
+
+        Parameters
+        ----------
+        page: int
+            The page of the cancel counters to show.
+        """
+        standings = await self.standings.get(ctx.guild)
+        await self.send_leaderboard_page(ctx, standings.cancel_counters,
+                "How Many Cancellations", page)
 
 
     async def get_option_strings(self, guild:discord.Guild) -> str:
@@ -695,7 +802,8 @@ class Dad(commands.Cog):
             Member of which points are being reset
         """
         # Set new points
-        await self._conf.member(member).points.set(0)
+        await self.points_ledger.set(member, 0)
+        (await self.standings.get(ctx.guild)).points.remove(member.id)
         
         # Recalculate favorite child for the associated guild
         await FavoritismJoke.calculate_favoritism_in_guild(self, ctx.guild)
@@ -719,9 +827,8 @@ class Dad(commands.Cog):
         """Admin command for resetting points for all of Dad's children
         """
         # Reset Dad Points (TM) for all users in the server
-        for member in ctx.guild.members:
-            if not member.bot:
-                await self._conf.member(member).points.set(0)
+        await self.points_ledger.reset_guild(ctx.guild)
+        (await self.standings.get(ctx.guild)).points.clear()
 
         # Recalculate favorite child for the associated guild
         await FavoritismJoke.calculate_favoritism_in_guild(self, ctx.guild)
@@ -763,6 +870,34 @@ class Dad(commands.Cog):
         embed = discord.Embed.from_dict(contents)
         await ctx.send(embed=embed)
 
+    @commands.is_owner()
+    @dad_settings.command()
+    async def set_image_backup_dir(self, ctx: commands.Context,
+            backup_dir:str=None) -> None:
+        """Sets the directory made by `images.py backup` which Dad sends
+        images from when their urls are bad. Setting it again reloads the
+        backups, and leaving it out stops using backups.
+        Parameters
+        ----------
+        backup_dir: str
+            The path of the backup directory on the machine Dad runs on.
+        """
+        if not set_backup_dir(backup_dir):
+            contents = dict(
+                    title = "Set Image Backup Directory: Failure",
+                    description = f"No such directory: {backup_dir}"
+                    )
+        else:
+            await self._conf.image_backup_dir.set(backup_dir)
+            LOG.info(f"Image Backup Directory set to {backup_dir}")
+            contents = dict(
+                    title = "Set Image Backup Directory: Success",
+                    description = f"Image Backup Directory set to "\
+                            f"{backup_dir}"
+                    )
+        embed = discord.Embed.from_dict(contents)
+        await ctx.send(embed=embed)
+
 
     @commands.guild_only()
     @commands.admin()
@@ -778,10 +913,10 @@ class Dad(commands.Cog):
             Note, that you must actually give DadBot permissions to do it
             if this setting is on.
         """
-        flat_fuck_img_change = not await self._conf.guild(ctx.guild).\
-                flat_fuck_img_change()
-        await self._conf.guild(ctx.guild).flat_fuck_img_change.\
-                set(flat_fuck_img_change)
+        flat_fuck_img_change = not await self.guild_settings.get(ctx.guild,
+                "flat_fuck_img_change")
+        await self.guild_settings.set(ctx.guild, "flat_fuck_img_change",
+                flat_fuck_img_change)
         contents = dict(
                 title = "Flat Fuck Friday Server Image Change",
                 description = f"Set to **{flat_fuck_img_change}**"
@@ -840,7 +975,7 @@ class Dad(commands.Cog):
                       "System Channel Permission Denied")
             post_url_success = False
 
-        if not await self._conf.guild(guild).flat_fuck_img_change():
+        if not await self.guild_settings.get(guild, "flat_fuck_img_change"):
             set_icon_image_success = True
         else:
             # Ensure folder to make server icon backup exists
@@ -953,7 +1088,7 @@ class Dad(commands.Cog):
         guild_folder = cdp.joinpath(str(guild.id))
         icon_backup = guild_folder.joinpath("backup")
         if icon_backup.exists() and\
-                await self._conf.guild(guild).flat_fuck_img_change():
+                await self.guild_settings.get(guild, "flat_fuck_img_change"):
             with open(str(icon_backup), "rb") as fin:
                 icon = fin.read()
             try:
@@ -1006,6 +1141,48 @@ class Dad(commands.Cog):
     async def before_unroll_the_clip_loop(self):
         await self.bot.wait_until_ready()
 
+    @tasks.loop(seconds=5)
+    async def flush_points_loop(self):
+        """Save the changes to members' points made since the last loop."""
+        try:
+            await self.points_ledger.flush()
+        except Exception as e:
+            # Don't let a failed write kill the loop, try again next time
+            LOG.error(f"Points Flush: Failure -> {e}")
+
+
+    @tasks.loop(hours=1)
+    async def image_health_loop(self):
+        """Check the health of every image url, so that jokes only pick from
+        the healthy ones without having to check them first.
+        """
+        try:
+            await check_image_health()
+        except Exception as e:
+            # Don't let a failed check kill the loop, try again next time
+            LOG.error(f"Image Health Check: Failure -> {e}")
+
+
+    @image_health_loop.before_loop
+    async def before_image_health_loop(self):
+        await self.bot.wait_until_ready()
+        # Load the backups here rather than in on_ready, which isn't sent
+        # when the cog is loaded or reloaded on a bot that is already running
+        set_backup_dir(await self._conf.image_backup_dir())
+
+
+    @tasks.loop(seconds=30)
+    async def image_database_watch_loop(self):
+        """Reload the image database if it was edited, such as by
+        `images.py add`, so that the edits are used without a restart.
+        """
+        try:
+            await reload_if_changed()
+        except Exception as e:
+            # Don't let a bad edit kill the loop, try again next time
+            LOG.error(f"Image Database Reload: Failure -> {e}")
+
+
     @commands.command(aliases=["what_is_today", 
                               "how_many_days_till_christmas",
                               "when_is_christmas"])
@@ -0,0 +1,119 @@
+import discord
+from redbot.core import Config
+from typing import Iterable
+
+
+class GuildSettingsCache:
+    def __init__(self, conf:Config, default_guild_settings:dict):
+        """Init for the GuildSettingsCache object.
+        The purpose of this object is to keep the whole settings record of
+        each guild in memory so that reading an option, which Dad does several
+        times for every message, doesn't have to wait on storage.
+        Writes go through to the Config first and then update the record in
+        memory, so the two never disagree.
+
+        Parameters
+        ----------
+        conf: Config
+            The Config object the guild settings are stored in.
+        default_guild_settings: dict
+            The default values of every guild option.
+        """
+        self._conf = conf
+        self._defaults = default_guild_settings
+        self._guilds = dict()
+
+
+    async def warm(self, guild_ids:Iterable[int]) -> None:
+        """Load the records of all the given guilds in bulk.
+
+        Parameters
+        ----------
+        guild_ids: Iterable[int]
+            The ids of the guilds Dad is in. Guilds with nothing saved start
+            out with the default values.
+        """
+        saved_guilds = await self._conf.all_guilds()
+        for guild_id in guild_ids:
+            settings = dict(self._defaults)
+            settings.update(saved_guilds.get(guild_id, {}))
+            self._guilds[guild_id] = settings
+
+
+    async def _guild_settings(self, guild:discord.Guild) -> dict:
+        """Return the in memory record of a guild, loading it if needed.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to get the record of.
+
+        Returns
+        -------
+        dict
+            The settings record of the guild.
+        """
+        try:
+            return self._guilds[guild.id]
+        except KeyError:
+            settings = dict(self._defaults)
+            settings.update(await self._conf.guild(guild).all())
+            self._guilds[guild.id] = settings
+            return settings
+
+
+    async def get(self, guild:discord.Guild, option_name:str) -> any:
+        """Return the value of an option for a guild.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to get the option of.
+        option_name: str
+            The option to get.
+
+        Returns
+        -------
+        any
+            The value of the option.
+
+        Raises
+        ------
+        KeyError
+            Raised if the given option_name does not exist.
+        """
+        return (await self._guild_settings(guild))[option_name]
+
+
+    async def set(self, guild:discord.Guild, option_name:str,
+            new_value:any) -> None:
+        """Set the value of an option for a guild, writing it through to the
+        Config.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to set the option of.
+        option_name: str
+            The option to set.
+        new_value: any
+            The new value for the option.
+
+        Raises
+        ------
+        AttributeError
+            Raised if the given option_name does not exist.
+        """
+        await getattr(self._conf.guild(guild), option_name).set(new_value)
+        (await self._guild_settings(guild))[option_name] = new_value
+
+
+    def forget(self, guild:discord.Guild) -> None:
+        """Drop the in memory record of a guild.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to forget the record of.
+        """
+        self._guilds.pop(guild.id, None)
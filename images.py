@@ -1,23 +1,108 @@
 #!/usr/bin/env python3
+import aiohttp
 import argparse
+import asyncio
+import csv
+import hashlib
 import json
 import logging
 import os
 import random
 random.seed()
-import requests
+import re
+import sqlite3
+import struct
+import sys
+import tempfile
 import time
-from typing import Iterable
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from contextlib import closing
+from typing import (Awaitable, Callable, Dict, Iterable, Iterator, Optional,
+        TextIO, Tuple)
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
 
 LOG = logging.getLogger("red.dad")
 
-# Set up the file path to the json file which acts as our database.
+# Set up the file path to the SQLite file which acts as our database.
+# It is created from the json file the first time it's needed, and the json
+# file is merged into it again whenever the json file changes, such as when
+# a new one is pulled.
 FILE_DIR = os.path.dirname(os.path.abspath(__file__))
 IMAGES_JSON = os.path.join(FILE_DIR, "images.json")
+IMAGES_DB = os.path.join(FILE_DIR, "images.db")
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS images (
+    url TEXT PRIMARY KEY
+);
+CREATE TABLE IF NOT EXISTS image_categories (
+    url TEXT NOT NULL REFERENCES images (url),
+    category TEXT NOT NULL,
+    PRIMARY KEY (url, category)
+);
+CREATE INDEX IF NOT EXISTS image_categories_by_category
+    ON image_categories (category);
+CREATE TABLE IF NOT EXISTS image_metadata (
+    url TEXT PRIMARY KEY REFERENCES images (url),
+    content_type TEXT,
+    size INTEGER,
+    width INTEGER,
+    height INTEGER,
+    animated INTEGER
+);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+# The key in meta of the SHA-256 of the json file last merged in
+_JSON_HASH_KEY = "images_json_sha256"
+# The columns of image_metadata which describe the image
+_METADATA_FIELDS = ("content_type", "size", "width", "height", "animated")
+# How much of an image file is read to describe it, which is enough for the
+# headers and, usually, the first frame of a GIF
+_METADATA_BYTES = 1024*1024
+# The health of each url is kept next to it
+IMAGE_HEALTH_JSON = os.path.join(FILE_DIR, "image_health.json")
 
-# Open up the database of images
-with open(IMAGES_JSON) as fin:
-    IMAGES = json.load(fin)
+# The database of images, loaded on first use by _ensure_loaded
+IMAGES = None
+# The (inode, modification time, size) of the database when it was loaded
+_IMAGES_STAT = None
+
+# Indexes of the database, the urls in each category and the image of each url
+CATEGORY_INDEX = dict()
+URL_INDEX = dict()
+# The image of each canonical url, see canonical_url
+CANONICAL_INDEX = dict()
+# The urls in each category that meet each set of constraints, keyed by
+# category and then (animated, size tier, dimension tier), see _bucket_key
+_BUCKETS = dict()
+# The largest file sizes, and the largest widths or heights, that images can
+# be constrained to. Constraints are rounded down to the closest tier.
+SIZE_TIERS = (512*1024, 1024*1024, 2*1024*1024, 4*1024*1024, 8*1024*1024)
+DIMENSION_TIERS = (240, 320, 480, 720, 1080)
+# Hosts which serve the same images as another host, and the host they mirror
+_MIRROR_HOSTS = (
+        (re.compile(r"(media\d*|c)\.tenor\.com"), "media.tenor.com"),
+        (re.compile(r"media\d*\.giphy\.com"), "media.giphy.com"),
+        )
+# Query parameters of each host which don't change the image
+_IGNORED_QUERY_KEYS = {"media.tenor.com": frozenset(("itemid",))}
+
+# Health of each url, keyed by url
+HEALTH = dict()
+# Shuffle-bags of each guild, keyed by guild id and then category
+_SHUFFLE_BAGS = dict()
+
+# Backups of each url, loaded from the manifest of the backup directory
+_BACKUP_DIR = None
+_BACKUPS = dict()
+
+# Shared HTTP session for checking urls from within the bot
+_SESSION = None
+# How long to wait on a url before deeming it bad
+_URL_CHECK_TIMEOUT = aiohttp.ClientTimeout(total=5)
 
 
 def image_urls_in_category(category:str) -> Iterable[str]:
@@ -33,45 +118,997 @@ def image_urls_in_category(category:str) -> Iterable[str]:
     Iterable[str]
         The yielded urls with a matching category.
     """
+    _ensure_loaded()
+    yield from CATEGORY_INDEX.get(category, ())
+
+
+def _connect() -> sqlite3.Connection:
+    """Open the database, migrating the json file into it if it doesn't exist
+    yet, or merging the json file into it if it changed since it was last
+    merged.
+
+    Returns
+    -------
+    sqlite3.Connection
+        The connection to the database.
+    """
+    if not os.path.isfile(IMAGES_DB):
+        _migrate_json()
+    conn = sqlite3.connect(IMAGES_DB)
+    conn.executescript(_SCHEMA)
+    try:
+        _merge_json(conn)
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        # Keep using the database as it is rather than failing every load
+        LOG.error(f"Images Database: Failure merging {IMAGES_JSON} -> {e}")
+    return conn
+
+
+def _migrate_json() -> None:
+    """Build the database from the json file.
+    The database is built in a temporary file and only moved into place once
+    it's complete, so a failed migration is tried again next time rather
+    than leaving an empty database behind.
+    """
+    fd, part_path = tempfile.mkstemp(suffix=".part", dir=FILE_DIR)
+    os.close(fd)
+    try:
+        with closing(sqlite3.connect(part_path)) as conn:
+            conn.executescript(_SCHEMA)
+            _merge_json(conn)
+        os.replace(part_path, IMAGES_DB)
+    except BaseException:
+        # Never leave a partial database behind
+        if os.path.isfile(part_path):
+            os.remove(part_path)
+        raise
+
+
+def _merge_json(conn:sqlite3.Connection) -> None:
+    """Upsert the json file into the database, unless it's the same json file
+    that was last merged in, as told by its SHA-256 kept in meta.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        The connection to the database.
+    """
+    with open(IMAGES_JSON, "rb") as fin:
+        data = fin.read()
+    sha256 = hashlib.sha256(data).hexdigest()
+    row = conn.execute("SELECT value FROM meta WHERE key = ?",
+            (_JSON_HASH_KEY,)).fetchone()
+    if row is not None and row[0] == sha256:
+        return
+    images = json.loads(data)
+    with conn:
+        _upsert_images(conn, ((img["url"], img["categories"]) for
+            img in images))
+        _upsert_metadata(conn, ((img["url"], img["metadata"]) for
+            img in images if img.get("metadata")))
+        conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+                (_JSON_HASH_KEY, sha256))
+    LOG.info(f"Images Database: Merged {len(images)} images from "\
+            f"{IMAGES_JSON}")
+
+
+def _upsert_images(conn:sqlite3.Connection,
+        images:Iterable[Tuple[str, list]]) -> None:
+    """Insert images into the database, adding categories to the images that
+    already exist. The caller is responsible for committing.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        The connection to the database.
+    images: Iterable[Tuple[str, list]]
+        The url and list of categories of each image.
+    """
+    for url, categories in images:
+        conn.execute("INSERT OR IGNORE INTO images (url) VALUES (?)", (url,))
+        conn.executemany(
+                "INSERT OR IGNORE INTO image_categories (url, category) "\
+                "VALUES (?, ?)", ((url, cat) for cat in categories))
+
+
+def _upsert_metadata(conn:sqlite3.Connection,
+        metadata:Iterable[Tuple[str, dict]]) -> None:
+    """Record the metadata of images, keeping what's already known of any
+    field that is missing or None. The caller is responsible for committing.
+
+    Parameters
+    ----------
+    conn: sqlite3.Connection
+        The connection to the database.
+    metadata: Iterable[Tuple[str, dict]]
+        The url and metadata of each image.
+    """
+    conn.executemany(
+            "INSERT INTO image_metadata (url, content_type, size, width, "\
+            "height, animated) VALUES (?, ?, ?, ?, ?, ?) "\
+            "ON CONFLICT (url) DO UPDATE SET " + ", ".join(
+                f"{field} = COALESCE(excluded.{field}, {field})" for
+                field in _METADATA_FIELDS),
+            ((url, *(meta.get(field) for field in _METADATA_FIELDS)) for
+                url, meta in metadata))
+
+
+def _images_stat() -> tuple:
+    """Return the (inode, modification time, size) of the database file, and
+    of the json file which is merged into it, which change whenever either
+    file is edited or replaced."""
+    stats = []
+    for path in (IMAGES_DB, IMAGES_JSON):
+        try:
+            stat = os.stat(path)
+            stats.append((stat.st_ino, stat.st_mtime_ns, stat.st_size))
+        except FileNotFoundError:
+            stats.append(None)
+    return tuple(stats)
+
+
+def _read_images() -> tuple:
+    """Read the database.
+
+    Returns
+    -------
+    tuple
+        The list of images and the stat of the file before it was read.
+    """
+    with closing(_connect()) as conn:
+        stat = _images_stat()
+        images = []
+        by_url = dict()
+        for url, category in conn.execute(
+                "SELECT images.url, category FROM images "\
+                "LEFT JOIN image_categories USING (url) "\
+                "ORDER BY images.rowid"):
+            img = by_url.get(url)
+            if img is None:
+                img = by_url[url] = {"url": url, "categories": [],
+                        "metadata": {}}
+                images.append(img)
+            if category is not None:
+                img["categories"].append(category)
+        for url, *values in conn.execute("SELECT url, " +
+                ", ".join(_METADATA_FIELDS) + " FROM image_metadata"):
+            if url in by_url:
+                by_url[url]["metadata"] = {field: value for field, value in
+                        zip(_METADATA_FIELDS, values) if value is not None}
+                if "animated" in by_url[url]["metadata"]:
+                    by_url[url]["metadata"]["animated"] = \
+                            bool(by_url[url]["metadata"]["animated"])
+        return images, stat
+
+
+def _set_images(images:list, stat:tuple) -> None:
+    """Replace the database of images, and index it.
+
+    Parameters
+    ----------
+    images: list
+        The new list of images.
+    stat: tuple
+        The stat of the file the images were read from.
+    """
+    global IMAGES, _IMAGES_STAT
+    IMAGES = images
+    _IMAGES_STAT = stat
+    _build_indexes()
+
+
+def _ensure_loaded() -> None:
+    """Load the database of images and the health of each url, if they
+    haven't been already."""
+    if IMAGES is None:
+        _set_images(*_read_images())
+        load_health()
+
+
+async def reload_if_changed() -> bool:
+    """Reload the database of images if its file changed since it was loaded.
+    The file is read in a worker thread so the event loop isn't blocked.
+
+    Returns
+    -------
+    bool
+        Rather the database was reloaded.
+    """
+    if IMAGES is not None and _images_stat() == _IMAGES_STAT:
+        return False
+    images, stat = await asyncio.get_running_loop().run_in_executor(
+            None, _read_images)
+    _set_images(images, stat)
+    LOG.info(f"Images Database: Reloaded {len(images)} images")
+    return True
+
+
+def canonical_url(url:str) -> str:
+    """Return the canonical form of a url, which is the same for urls that
+    only differ in ways that don't change the image. That is the case of the
+    scheme and host, mirrors of the same host, default ports, trailing
+    slashes, fragments, tracking parameters, and the order of the query.
+
+    Parameters
+    ----------
+    url: str
+        The url to make canonical.
+
+    Returns
+    -------
+    str
+        The canonical url.
+    """
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        # Too malformed to take apart, so it can only match itself
+        return url.strip()
+    host = parts.hostname or ""
+    for host_re, mirrored_host in _MIRROR_HOSTS:
+        if host_re.fullmatch(host):
+            host = mirrored_host
+            break
+    ignored_keys = _IGNORED_QUERY_KEYS.get(host, ())
+    try:
+        port = parts.port
+    except ValueError:
+        # Out of range, so it can't be the default, keep it as written
+        port = parts.netloc.rpartition(":")[2]
+    # Keep ports that aren't the default of the scheme
+    if port is not None and \
+            (parts.scheme.lower(), port) not in (("http", 80),
+                ("https", 443)):
+        host = f"{host}:{port}"
+    query = sorted((key, value) for key, value in
+            parse_qsl(parts.query, keep_blank_values=True) if
+            key not in ignored_keys and not key.startswith("utm_"))
+    return urlunsplit((parts.scheme.lower(), host,
+        parts.path.rstrip("/") or "/", urlencode(query), ""))
+
+
+def _resolve_url(url:str, batch_urls:dict) -> str:
+    """Return the url an image is stored under. That is the url of the image
+    already in the database with the same canonical url, if any, otherwise
+    the first url of the batch with the same canonical url.
+
+    Parameters
+    ----------
+    url: str
+        The url of the image.
+    batch_urls: dict
+        The first url of each canonical url in the batch, which is updated.
+
+    Returns
+    -------
+    str
+        The url to store the image under.
+    """
+    canonical = canonical_url(url)
+    img = CANONICAL_INDEX.get(canonical)
+    if img is not None:
+        return img["url"]
+    return batch_urls.setdefault(canonical, url)
+
+
+def _tier(tiers:tuple, value:Optional[int]) -> int:
+    """Return the index of the smallest tier that fits the value. Values
+    that are unknown or larger than every tier get len(tiers)."""
+    if value is None:
+        return len(tiers)
+    return bisect_left(tiers, value)
+
+
+def _bucket_key(animated:Optional[bool], max_bytes:Optional[int],
+        max_dimension:Optional[int]) -> tuple:
+    """Return the key of the bucket of images meeting the given constraints,
+    with each limit rounded down to the closest tier.
+
+    Parameters
+    ----------
+    animated: Optional[bool]
+        Rather the images must be animated, or must be still. None for
+        either.
+    max_bytes: Optional[int]
+        The largest file size allowed, or None for any.
+    max_dimension: Optional[int]
+        The largest width or height allowed, or None for any.
+
+    Returns
+    -------
+    tuple
+        The key of the bucket. A tier of -1 means no tier is small enough.
+    """
+    size_tier = len(SIZE_TIERS) if max_bytes is None else \
+            bisect_right(SIZE_TIERS, max_bytes) - 1
+    dimension_tier = len(DIMENSION_TIERS) if max_dimension is None else \
+            bisect_right(DIMENSION_TIERS, max_dimension) - 1
+    return (animated, size_tier, dimension_tier)
+
+
+def _build_buckets() -> dict:
+    """Return the urls in each category that meet each set of constraints.
+    An image is in every bucket whose limits it's within, so picking an
+    image that meets a set of constraints is a single lookup."""
+    bucket_lists = dict()
     for img in IMAGES:
-        if category in img["categories"]:
-            yield img["url"]
+        meta = img.get("metadata", {})
+        size_tier = _tier(SIZE_TIERS, meta.get("size"))
+        dimension = None
+        if "width" in meta and "height" in meta:
+            dimension = max(meta["width"], meta["height"])
+        dimension_tier = _tier(DIMENSION_TIERS, dimension)
+        animated_keys = (None,) if meta.get("animated") is None else \
+                (None, meta["animated"])
+        for category in img["categories"]:
+            category_buckets = bucket_lists.setdefault(category, dict())
+            for animated in animated_keys:
+                for size in range(size_tier, len(SIZE_TIERS) + 1):
+                    for dim in range(dimension_tier,
+                            len(DIMENSION_TIERS) + 1):
+                        category_buckets.setdefault((animated, size, dim),
+                                []).append(img["url"])
+    return {category: {key: tuple(urls) for key, urls in buckets.items()}
+            for category, buckets in bucket_lists.items()}
 
 
-def random_image_url_in_category(category:str) -> str:
+def _build_indexes() -> None:
+    """Build the category, url, and canonical url indexes of the database, so
+    that lookups don't have to scan every image.
+    Categories that didn't change keep their old tuple of urls."""
+    global CATEGORY_INDEX, URL_INDEX, CANONICAL_INDEX, _BUCKETS
+    category_lists = dict()
+    url_index = dict()
+    canonical_index = dict()
+    for img in IMAGES:
+        url_index[img["url"]] = img
+        canonical_index.setdefault(canonical_url(img["url"]), img)
+        for category in img["categories"]:
+            category_lists.setdefault(category, []).append(img["url"])
+    category_index = dict()
+    for category, urls in category_lists.items():
+        urls = tuple(urls)
+        old_urls = CATEGORY_INDEX.get(category)
+        category_index[category] = old_urls if old_urls == urls else urls
+    CATEGORY_INDEX = category_index
+    URL_INDEX = url_index
+    CANONICAL_INDEX = canonical_index
+    _BUCKETS = _build_buckets()
+
+
+class ShuffleBag:
+    def __init__(self, size:int):
+        """Init for the ShuffleBag object.
+        Hands out the indices [0,size) in a random order without replacement,
+        and once all have been handed out shuffles them again. This keeps
+        small categories from repeating the same image over and over.
+        The indices are shuffled in place, so drawing doesn't allocate.
+
+        Parameters
+        ----------
+        size: int
+            The number of indices in the bag.
+        """
+        self._indices = list(range(size))
+        self._next = size
+
+
+    def __len__(self) -> int:
+        """Return the number of indices in the bag"""
+        return len(self._indices)
+
+
+    def draw(self) -> int:
+        """Return the next index, refilling the bag if it's empty.
+
+        Returns
+        -------
+        int
+            The drawn index.
+        """
+        if self._next >= len(self._indices):
+            random.shuffle(self._indices)
+            self._next = 0
+        ind = self._indices[self._next]
+        self._next += 1
+        return ind
+
+
+def is_url_healthy(url:str) -> bool:
+    """Return rather the url passed its last health check.
+    Urls that have never been checked are assumed healthy.
+
+    Parameters
+    ----------
+    url: str
+        The url to check the health of.
+
+    Returns
+    -------
+    bool
+        Rather the url is without a failure streak.
+    """
+    health = HEALTH.get(url)
+    return health is None or health["failure_streak"] == 0
+
+
+def random_image_url_in_category(category:str, guild_id:int=None,
+        max_bytes:int=None, animated:bool=None,
+        max_dimension:int=None) -> str:
     """Return random url in selected category.
-    Note, it will fail if there are no images in the selected category.
+    Each guild draws from its own shuffle-bag of the category, so an image
+    won't repeat in a guild until all the others have been seen.
+    No network requests are made, urls that failed their last health check
+    are skipped. If all have failed, then any url in the category may be
+    picked.
+    The images can be constrained by their metadata, as recorded by
+    `images.py backup`. Limits are rounded down to the closest of
+    SIZE_TIERS and DIMENSION_TIERS, and images without the metadata don't
+    meet any constraint. If no image meets the constraints, then any image
+    in the category may be picked.
+    Note, it will return an empty string if there are no images in the 
+    selected category.
 
     Parameters
     ----------
     category: str
         The category to find an image in.
+    guild_id: int=None
+        The id of the guild the image is for.
+    max_bytes: int=None
+        The largest file size allowed.
+    animated: bool=None
+        Rather the image must be animated, or must be still.
+    max_dimension: int=None
+        The largest width or height allowed.
 
     Returns
     -------
     str
         The url of the selected image.
     """
-    matching_urls = list(image_urls_in_category(category))
-    url = ""
-    while len(matching_urls) > 0:
-        url = random.choice(matching_urls)
-        matching_urls.remove(url)
-        # Test url
-        response = requests.get(url)
-        if response.ok:
-            # This url is okay, so send it
-            LOG.info(f"Good URL: {url}")
+    _ensure_loaded()
+    urls = CATEGORY_INDEX.get(category)
+    if not urls:
+        return ""
+    bag_key = category
+    if (max_bytes, animated, max_dimension) != (None, None, None):
+        key = _bucket_key(animated, max_bytes, max_dimension)
+        bucket = _BUCKETS.get(category, {}).get(key)
+        if bucket:
+            urls = bucket
+            bag_key = (category, key)
+    # Get the shuffle-bag, making a new one if the category changed
+    guild_bags = _SHUFFLE_BAGS.get(guild_id)
+    if guild_bags is None:
+        guild_bags = _SHUFFLE_BAGS[guild_id] = dict()
+    bag = guild_bags.get(bag_key)
+    if bag is None or len(bag) != len(urls):
+        bag = guild_bags[bag_key] = ShuffleBag(len(urls))
+    # Draw until a healthy url is found
+    for _ in range(len(urls)):
+        url = urls[bag.draw()]
+        if is_url_healthy(url):
             return url
+    # Nothing is known to be healthy, so take a chance on anything
+    return urls[bag.draw()]
+
+
+class ByteLRU:
+    def __init__(self, max_bytes:int):
+        """Init for the ByteLRU object.
+        The purpose of this object is to keep the most recently used images
+        in memory, while never holding more than a set number of bytes.
+        When adding an image would go over the limit, the least recently used
+        images are dropped until it fits.
+
+        Parameters
+        ----------
+        max_bytes: int
+            The most bytes to hold at once.
+        """
+        self.max_bytes = max_bytes
+        self._size = 0
+        self._data = OrderedDict()
+
+
+    def __len__(self) -> int:
+        """Return the number of items held"""
+        return len(self._data)
+
+
+    def get(self, key:str) -> Optional[bytes]:
+        """Return the bytes of a key, marking them as the most recently used.
+
+        Parameters
+        ----------
+        key: str
+            The key of the bytes.
+
+        Returns
+        -------
+        Optional[bytes]
+            The bytes of the key, or None if they aren't held.
+        """
+        data = self._data.get(key)
+        if data is not None:
+            self._data.move_to_end(key)
+        return data
+
+
+    def put(self, key:str, data:bytes) -> None:
+        """Hold the bytes of a key, dropping the least recently used bytes to
+        make room. Bytes larger than the whole limit aren't held.
+
+        Parameters
+        ----------
+        key: str
+            The key of the bytes.
+        data: bytes
+            The bytes to hold.
+        """
+        old_data = self._data.pop(key, None)
+        if old_data is not None:
+            self._size -= len(old_data)
+        if len(data) > self.max_bytes:
+            return
+        while self._size + len(data) > self.max_bytes:
+            _, dropped = self._data.popitem(last=False)
+            self._size -= len(dropped)
+        self._data[key] = data
+        self._size += len(data)
+
+
+    def clear(self) -> None:
+        """Drop everything held."""
+        self._data.clear()
+        self._size = 0
+
+
+
+# The bytes of the most recently sent backups, keyed by SHA-256
+_BACKUP_BYTES = ByteLRU(32*1024*1024)
+
+
+def set_backup_dir(backup_dir:Optional[str]) -> bool:
+    """Set the directory made by `images.py backup` to send images from when
+    their urls are bad, and load its manifest.
+    Setting the same directory again reloads its manifest.
+
+    Parameters
+    ----------
+    backup_dir: Optional[str]
+        The path of the backup directory, or None to not use backups.
+
+    Returns
+    -------
+    bool
+        Rather the backups were set. False if there's no such directory, in
+        which case the current backups are kept.
+    """
+    global _BACKUP_DIR, _BACKUPS
+    if backup_dir is not None and not os.path.isdir(backup_dir):
+        LOG.error(f"Image Backups: No such directory -> {backup_dir}")
+        return False
+    _BACKUP_BYTES.clear()
+    _BACKUP_DIR = backup_dir
+    _BACKUPS = dict() if backup_dir is None else load_manifest(backup_dir)
+    LOG.info(f"Image Backups: Loaded {len(_BACKUPS)} backups")
+    return True
+
+
+def _read_bytes(path:str) -> bytes:
+    """Return the contents of a file."""
+    with open(path, "rb") as fin:
+        return fin.read()
+
+
+async def backup_image_bytes(url:str) -> Optional[bytes]:
+    """Return the backed up image of a url.
+    Recently sent images are held in memory, anything else is read from the
+    backup directory in a worker thread so the event loop isn't blocked.
+
+    Parameters
+    ----------
+    url: str
+        The url of the image.
+
+    Returns
+    -------
+    Optional[bytes]
+        The image, or None if the url isn't backed up.
+    """
+    backup = _BACKUPS.get(url)
+    if backup is None:
+        return None
+    data = _BACKUP_BYTES.get(backup["sha256"])
+    if data is None:
+        try:
+            data = await asyncio.get_running_loop().run_in_executor(None,
+                    _read_bytes, backup_path(_BACKUP_DIR, backup))
+        except OSError as e:
+            LOG.error(f"Image Backups: Failure -> {e}")
+            return None
+        _BACKUP_BYTES.put(backup["sha256"], data)
+    return data
+
+
+def image_file_extension(data:bytes) -> str:
+    """Return the file extension for an image, based on its first bytes.
+
+    Parameters
+    ----------
+    data: bytes
+        The image.
+
+    Returns
+    -------
+    str
+        The extension, without the dot. Unknown images are assumed to be GIFs.
+    """
+    if data.startswith(b"\x89PNG"):
+        return "png"
+    elif data.startswith(b"\xff\xd8"):
+        return "jpg"
+    elif data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+        return "webp"
+    return "gif"
+
+
+def _gif_frame_count(data:bytes) -> int:
+    """Return the number of frames in a GIF, stopping at 2."""
+    pos = 13
+    flags = data[10]
+    # Skip the global color table
+    if flags & 0x80:
+        pos += 3*2**((flags & 0x07) + 1)
+    frames = 0
+    while pos < len(data) and frames < 2:
+        block = data[pos]
+        if block == 0x2C:
+            # Image descriptor, then its local color table and LZW code size
+            frames += 1
+            flags = data[pos + 9]
+            pos += 10
+            if flags & 0x80:
+                pos += 3*2**((flags & 0x07) + 1)
+            pos += 1
+        elif block == 0x21:
+            # Extension, the label is followed by sub-blocks
+            pos += 2
         else:
-            LOG.error(f"Bad URL: {url}")
-    return url
+            break
+        # Skip the sub-blocks
+        while pos < len(data) and data[pos]:
+            pos += data[pos] + 1
+        pos += 1
+    return frames
+
+
+def image_metadata(data:bytes, size:int=None) -> dict:
+    """Return what can be told about an image from its bytes, which are its
+    content type, size, dimensions, and rather it's animated.
+    GIFs, PNGs, JPEGs, and WebPs are understood, anything else only gets a
+    size.
+
+    Parameters
+    ----------
+    data: bytes
+        The image, or just the start of it.
+    size: int=None
+        The size of the whole image, if data is just the start of it.
+
+    Returns
+    -------
+    dict
+        The metadata of the image, leaving out anything that can't be told.
+    """
+    metadata = {"size": len(data) if size is None else size}
+    # Anything not found in the start of an image may still be past it
+    partial = len(data) < metadata["size"]
+    try:
+        if data[:6] in (b"GIF87a", b"GIF89a"):
+            metadata["content_type"] = "image/gif"
+            metadata["width"], metadata["height"] = \
+                    struct.unpack("<HH", data[6:10])
+            frames = _gif_frame_count(data)
+            if frames > 1 or not partial:
+                metadata["animated"] = frames > 1
+        elif data.startswith(b"\x89PNG\r\n\x1a\n"):
+            metadata["content_type"] = "image/png"
+            metadata["width"], metadata["height"] = \
+                    struct.unpack(">II", data[16:24])
+            # APNGs have an animation control chunk before the image data
+            idat = data.find(b"IDAT")
+            header = data if idat == -1 else data[:idat]
+            if b"acTL" in header or idat != -1 or not partial:
+                metadata["animated"] = b"acTL" in header
+        elif data.startswith(b"\xff\xd8"):
+            metadata["content_type"] = "image/jpeg"
+            metadata["animated"] = False
+            pos = 2
+            while pos + 9 <= len(data) and data[pos] == 0xFF:
+                marker = data[pos + 1]
+                if marker == 0xFF:
+                    # Padding
+                    pos += 1
+                elif 0xC0 <= marker <= 0xCF and \
+                        marker not in (0xC4, 0xC8, 0xCC):
+                    # Start of frame
+                    metadata["height"], metadata["width"] = \
+                            struct.unpack(">HH", data[pos + 5:pos + 9])
+                    break
+                else:
+                    pos += 2 + struct.unpack(">H", data[pos + 2:pos + 4])[0]
+        elif data.startswith(b"RIFF") and data[8:12] == b"WEBP":
+            metadata["content_type"] = "image/webp"
+            chunk = data[12:16]
+            if chunk == b"VP8X":
+                metadata["animated"] = bool(data[20] & 0x02)
+                metadata["width"] = 1 + int.from_bytes(data[24:27], "little")
+                metadata["height"] = 1 + int.from_bytes(data[27:30],
+                        "little")
+            elif chunk == b"VP8L":
+                bits = int.from_bytes(data[21:25], "little")
+                metadata["animated"] = False
+                metadata["width"] = (bits & 0x3FFF) + 1
+                metadata["height"] = ((bits >> 14) & 0x3FFF) + 1
+            elif chunk == b"VP8 ":
+                width, height = struct.unpack("<HH", data[26:30])
+                metadata["animated"] = False
+                metadata["width"] = width & 0x3FFF
+                metadata["height"] = height & 0x3FFF
+    except (IndexError, struct.error):
+        # Truncated, so keep whatever was found before the end
+        pass
+    return metadata
+
+
+def _file_metadata(path:str) -> dict:
+    """Return what can be told about an image file from its first
+    _METADATA_BYTES, rather than reading the whole file.
+
+    Parameters
+    ----------
+    path: str
+        The path of the image.
+
+    Returns
+    -------
+    dict
+        The metadata of the image, leaving out anything that can't be told.
+    """
+    with open(path, "rb") as fin:
+        size = os.fstat(fin.fileno()).st_size
+        return image_metadata(fin.read(_METADATA_BYTES), size)
+
+
+def _get_session() -> aiohttp.ClientSession:
+    """Return the shared HTTP session, creating it if needed.
+    Sharing one session lets every check reuse pooled connections.
+
+    Returns
+    -------
+    aiohttp.ClientSession
+        The shared session.
+    """
+    global _SESSION
+    if _SESSION is None or _SESSION.closed:
+        _SESSION = aiohttp.ClientSession(timeout=_URL_CHECK_TIMEOUT)
+    return _SESSION
+
+
+async def close_session() -> None:
+    """Close the shared HTTP session, if it was ever opened."""
+    global _SESSION
+    if _SESSION is not None:
+        await _SESSION.close()
+        _SESSION = None
+
+
+def _response_metadata(response:aiohttp.ClientResponse) -> dict:
+    """Return the content type and size of an image from the headers of a
+    response, leaving out whichever aren't given."""
+    metadata = dict()
+    if not 200 <= response.status < 300:
+        return metadata
+    content_type = response.headers.get("Content-Type")
+    if content_type:
+        metadata["content_type"] = content_type.split(";")[0].strip()
+    # A response to a range request gives the full size after the slash
+    content_range = response.headers.get("Content-Range", "")
+    if content_range.rpartition("/")[2].isdigit():
+        metadata["size"] = int(content_range.rpartition("/")[2])
+    elif response.status == 200 and response.content_length is not None:
+        metadata["size"] = response.content_length
+    return metadata
+
+
+async def url_info(url:str) -> Tuple[Optional[int], dict]:
+    """Return the HTTP status of the url, and what its headers say about the
+    image, without downloading the image.
+    A HEAD request is tried first, falling back to asking for only the first
+    byte for servers that don't allow HEAD.
+
+    Parameters
+    ----------
+    url: str
+        The url to check.
+
+    Returns
+    -------
+    Tuple[Optional[int], dict]
+        The HTTP status, or None if the url didn't respond in time, and the
+        content type and size of the image, if given.
+    """
+    session = _get_session()
+    try:
+        async with session.head(url, allow_redirects=True) as response:
+            if response.status not in (405, 501):
+                return response.status, _response_metadata(response)
+        async with session.get(url, headers={"Range": "bytes=0-0"}) \
+                as response:
+            return response.status, _response_metadata(response)
+    except (aiohttp.ClientError, asyncio.TimeoutError):
+        return None, dict()
+
+
+async def url_status(url:str) -> Optional[int]:
+    """Return the HTTP status of the url, without downloading the image.
+    See url_info.
+
+    Parameters
+    ----------
+    url: str
+        The url to check.
+
+    Returns
+    -------
+    Optional[int]
+        The HTTP status, or None if the url didn't respond in time.
+    """
+    return (await url_info(url))[0]
+
+
+def load_health() -> None:
+    """Load the saved health of each url."""
+    global HEALTH
+    if os.path.isfile(IMAGE_HEALTH_JSON):
+        with open(IMAGE_HEALTH_JSON) as fin:
+            HEALTH = json.load(fin)
+
+
+def save_health() -> None:
+    """Save the health of each url next to the database of images."""
+    with open(IMAGE_HEALTH_JSON, "w") as fout:
+        json.dump(HEALTH, fout, indent=1)
+
+
+async def check_image_health(concurrency:int=8) -> None:
+    """Check the health of every url in the database, then save the results.
+    Urls with the same canonical url are only checked once.
+
+    Parameters
+    ----------
+    concurrency: int=8
+        The most urls to check at the same time.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(urls:list) -> None:
+        async with semaphore:
+            status, metadata = await url_info(urls[0])
+        if metadata:
+            found_metadata.update((url, metadata) for url in urls)
+        for url in urls:
+            health = HEALTH.setdefault(url, {"failure_streak": 0})
+            health["last_checked"] = time.time()
+            health["status"] = status
+            if status is not None and 200 <= status < 400:
+                health["failure_streak"] = 0
+            else:
+                health["failure_streak"] += 1
+                LOG.error(f"Bad URL: {url}")
+
+    _ensure_loaded()
+    # Group the urls by their canonical url
+    groups = dict()
+    for img in IMAGES:
+        groups.setdefault(canonical_url(img["url"]), []).append(img["url"])
+    found_metadata = dict()
+    await asyncio.gather(*(check(urls) for urls in groups.values()))
+    save_health()
+    # Record the content type and size of the images, if they changed
+    changed = _changed_metadata(found_metadata)
+    if changed:
+        stat = await asyncio.get_running_loop().run_in_executor(None,
+                _write_metadata, changed)
+        _apply_metadata(changed, stat)
+
+
+def _changed_metadata(metadata:Dict[str, dict]) -> Dict[str, dict]:
+    """Return the metadata of the images in the database that differs from
+    what is known of them.
+
+    Parameters
+    ----------
+    metadata: Dict[str, dict]
+        The metadata of each url.
+
+    Returns
+    -------
+    Dict[str, dict]
+        The metadata of each url that's in the database and has changed.
+    """
+    changed = dict()
+    for url, meta in metadata.items():
+        img = URL_INDEX.get(url)
+        if img is not None and any(value is not None and
+                img["metadata"].get(field) != value for
+                field, value in meta.items()):
+            changed[url] = meta
+    return changed
+
+
+def _write_metadata(metadata:Dict[str, dict]) -> tuple:
+    """Save the metadata of images to the database.
+
+    Parameters
+    ----------
+    metadata: Dict[str, dict]
+        The metadata of each url.
+
+    Returns
+    -------
+    tuple
+        The stat of the database after the write.
+    """
+    with closing(_connect()) as conn:
+        with conn:
+            _upsert_metadata(conn, metadata.items())
+    return _images_stat()
+
+
+def _apply_metadata(metadata:Dict[str, dict], stat:tuple) -> None:
+    """Update the metadata of the images in memory after it was saved.
+
+    Parameters
+    ----------
+    metadata: Dict[str, dict]
+        The metadata of each url.
+    stat: tuple
+        The stat of the database after the metadata was saved.
+    """
+    global _IMAGES_STAT, _BUCKETS
+    for url, meta in metadata.items():
+        URL_INDEX[url]["metadata"].update((field, value) for field, value in
+                meta.items() if value is not None)
+    # This process already has the edits, so there's no need to reload them
+    _IMAGES_STAT = stat
+    _BUCKETS = _build_buckets()
+
+
+def record_metadata(metadata:Dict[str, dict]) -> None:
+    """Save the metadata of images in the database, such as their content
+    type, size, dimensions, and rather they're animated. Fields that are
+    missing or None are left as they were.
+
+    Parameters
+    ----------
+    metadata: Dict[str, dict]
+        The metadata of each url. Urls not in the database are ignored.
+    """
+    _ensure_loaded()
+    changed = _changed_metadata(metadata)
+    if changed:
+        _apply_metadata(changed, _write_metadata(changed))
 
 
 def add_url(url:str, categories:list[str]) -> None:
     """Add a new image to the database of images.
-    Note, if the url already exists then it will instead add the given
-    categories to the already existing list.
+    Note, if the url, or a url with the same canonical url, already exists
+    then it will instead add the given categories to the already existing
+    list.
 
     Parameters
     ----------
@@ -80,32 +1117,823 @@ def add_url(url:str, categories:list[str]) -> None:
     categories: list[str]
         The list of categories that apply to this image.
     """
-    # Check if the given url already exists
-    already_existed=False
-    for ind in range(len(IMAGES)):
-        if url == IMAGES[ind]["url"]:
-            already_existed = True
-            # Combine the categories
-            cats = set()
-            for cat in IMAGES[ind]["categories"]:
-                cats.add(cat)
-            for cat in categories:
-                cats.add(cat)
-            IMAGES[ind]["categories"] = list(set(cats))
-
-    if not already_existed:
-        IMAGES.append({
-            "url": url,
-            "categories": categories
-            })
+    add_urls([(url, categories)])
+
+
+def add_urls(images:Iterable[Tuple[str, list]]) -> None:
+    """Add new images to the database of images, in a single transaction.
+    Note, if a url, or a url with the same canonical url, already exists then
+    it will instead add the given categories to the already existing list.
 
+    Parameters
+    ----------
+    images: Iterable[Tuple[str, list]]
+        The url and list of categories of each image to save.
+    """
+    global _IMAGES_STAT
+    _ensure_loaded()
+    # Combine the categories of images with the same canonical url
+    batch_urls = dict()
+    merged = dict()
+    for url, categories in images:
+        merged.setdefault(_resolve_url(url, batch_urls), dict()).update(
+                dict.fromkeys(categories))
+    images = [(url, list(categories)) for url, categories in merged.items()]
     # Save the edits
-    with open(IMAGES_JSON, "w") as fout:
+    with closing(_connect()) as conn:
+        with conn:
+            _upsert_images(conn, images)
+    # This process already has the edits, so there's no need to reload them
+    _IMAGES_STAT = _images_stat()
+
+    for url, categories in images:
+        # Check if the given url already exists
+        img = URL_INDEX.get(url)
+        if img is not None:
+            # Combine the categories
+            new_categories = [cat for cat in categories if
+                    cat not in img["categories"]]
+            img["categories"] = img["categories"] + list(
+                    dict.fromkeys(new_categories))
+        else:
+            new_categories = categories
+            img = {
+                "url": url,
+                "categories": list(dict.fromkeys(categories)),
+                "metadata": {}
+                }
+            IMAGES.append(img)
+            URL_INDEX[url] = img
+            CANONICAL_INDEX[canonical_url(url)] = img
+        # Add the url to the categories it wasn't in
+        for cat in dict.fromkeys(new_categories):
+            CATEGORY_INDEX[cat] = CATEGORY_INDEX.get(cat, ()) + (url,)
+
+
+def export_images(json_path:str=IMAGES_JSON) -> None:
+    """Export the database of images to a json file, such as for committing
+    the images.json that new databases are created from.
+
+    Parameters
+    ----------
+    json_path: str=IMAGES_JSON
+        The path of the json file to write.
+    """
+    _ensure_loaded()
+    with open(json_path, "w") as fout:
         json.dump(IMAGES, fout, indent=1)
 
 
-def backup_images(backup_dir:str, quiet:bool=False) -> None:
+def dedupe_images(dry_run:bool=False) -> None:
+    """Combine the images in the database with the same canonical url into
+    the first of them, with all of their categories.
+
+    Parameters
+    ----------
+    dry_run: bool=False
+        If true then the duplicates are only reported.
+    """
+    global _IMAGES_STAT
+    _ensure_loaded()
+    # Group the images by their canonical url
+    groups = dict()
+    for img in IMAGES:
+        groups.setdefault(canonical_url(img["url"]), []).append(img)
+    duplicates = [group for group in groups.values() if len(group) > 1]
+
+    # Report the duplicates
+    for kept, *removed in duplicates:
+        print(f"Kept: {kept['url']}")
+        for img in removed:
+            print(f"Merged: {img['url']}")
+        print("-"*40)
+    print(f"Merged {sum(len(group) - 1 for group in duplicates)} duplicates "\
+          f"of {len(duplicates)} images")
+    if dry_run or not duplicates:
+        return
+
+    # Save the edits
+    with closing(_connect()) as conn:
+        with conn:
+            for kept, *removed in duplicates:
+                _upsert_images(conn, [(kept["url"], [cat for img in removed
+                    for cat in img["categories"]])])
+                # Fill in what the kept image is missing of the metadata of
+                # the removed ones, keeping what it already has
+                metadata = dict()
+                for img in (kept, *removed):
+                    for field, value in img["metadata"].items():
+                        metadata.setdefault(field, value)
+                if metadata:
+                    _upsert_metadata(conn, [(kept["url"], metadata)])
+                for img in removed:
+                    conn.execute("DELETE FROM image_categories WHERE url = ?",
+                            (img["url"],))
+                    conn.execute("DELETE FROM image_metadata WHERE url = ?",
+                            (img["url"],))
+                    conn.execute("DELETE FROM images WHERE url = ?",
+                            (img["url"],))
+    _set_images(*_read_images())
+    # Forget the health of the removed urls
+    for _, *removed in duplicates:
+        for img in removed:
+            HEALTH.pop(img["url"], None)
+    save_health()
+
+
+def _read_import_rows(fin:TextIO, file_format:str) -> Iterator[tuple]:
+    """Yield the images listed in an import file, one line at a time.
+    CSV lines are the url followed by its categories, one per column.
+    JSONL lines are objects with a "url" and a list of "categories".
+
+    Parameters
+    ----------
+    fin: TextIO
+        The file to read from.
+    file_format: str
+        Either "csv" or "jsonl".
+
+    Yields
+    ------
+    tuple
+        The line number, url, list of categories, and the reason the line was
+        rejected, which is None for good lines.
+    """
+    if file_format == "csv":
+        rows = ((row[0].strip(), [cat.strip() for cat in row[1:] if
+            cat.strip()]) if row else None for row in csv.reader(fin))
+    else:
+        def parse(line:str) -> tuple:
+            if not line.strip():
+                return None
+            try:
+                entry = json.loads(line)
+                url, categories = entry["url"], entry["categories"]
+                # A string is not a list of categories, even though it iterates
+                if not isinstance(url, str):
+                    raise TypeError("url is not a string")
+                if not isinstance(categories, list) or not all(
+                        isinstance(cat, str) for cat in categories):
+                    raise TypeError("categories is not a list of strings")
+                return url, categories
+            except (ValueError, TypeError, KeyError) as e:
+                return None, e
+        rows = (parse(line) for line in fin)
+
+    for line_number, row in enumerate(rows, 1):
+        # Skip blank lines
+        if row is None:
+            continue
+        url, categories = row
+        if url is None:
+            yield line_number, None, [], f"Malformed line: {categories}"
+            continue
+        try:
+            scheme = urlsplit(url).scheme
+        except ValueError:
+            yield line_number, url, categories, "Malformed url"
+            continue
+        if scheme not in ("http", "https"):
+            yield line_number, url, categories, "Not an http(s) url"
+        elif not categories:
+            yield line_number, url, categories, "No categories"
+        else:
+            yield line_number, url, categories, None
+
+
+async def _validate_urls(urls:Iterable[str],
+        concurrency:int) -> Dict[str, Optional[int]]:
+    """Check many urls at once, closing the shared session afterwards.
+
+    Parameters
+    ----------
+    urls: Iterable[str]
+        The urls to check.
+    concurrency: int
+        The most urls to check at the same time.
+
+    Returns
+    -------
+    Dict[str, Optional[int]]
+        The HTTP status of each url, or None if it didn't respond in time.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def check(url:str) -> Optional[int]:
+        async with semaphore:
+            return await url_status(url)
+
+    urls = list(urls)
+    try:
+        statuses = await asyncio.gather(*(check(url) for url in urls))
+    finally:
+        await close_session()
+    return dict(zip(urls, statuses))
+
+
+def import_images(source:str, file_format:str=None, concurrency:int=8,
+        skip_validation:bool=False) -> None:
+    """Add many images to the database of images with a single write.
+    Urls which are new to the database are checked first, and any which
+    don't respond with a good status are rejected. Urls which are already in
+    the database, or which are repeated, have their categories combined,
+    including urls which only match by their canonical url.
+
+    Parameters
+    ----------
+    source: str
+        The path of the CSV or JSONL file to import, or "-" for stdin.
+    file_format: str=None
+        Either "csv" or "jsonl". By default it's taken from the file
+        extension, with stdin being read as JSONL.
+    concurrency: int=8
+        The most urls to check at the same time.
+    skip_validation: bool=False
+        If true then new urls are added without being checked.
+    """
+    if file_format is None:
+        file_format = "csv" if source.lower().endswith(".csv") else "jsonl"
+
+    _ensure_loaded()
+    # Gather the images, combining the categories of repeated urls
+    accepted = dict()
+    rejected = []
+    batch_urls = dict()
+    fin = sys.stdin if source == "-" else open(source, newline="")
+    try:
+        for line_number, url, categories, reason in \
+                _read_import_rows(fin, file_format):
+            if reason is not None:
+                rejected.append((line_number, url, reason))
+            else:
+                accepted.setdefault(_resolve_url(url, batch_urls),
+                        dict()).update(dict.fromkeys(categories))
+    finally:
+        if fin is not sys.stdin:
+            fin.close()
+
+    # Check the urls that aren't already in the database
+    new_urls = [url for url in accepted if url not in URL_INDEX]
+    if new_urls and not skip_validation:
+        statuses = asyncio.run(_validate_urls(new_urls, concurrency))
+        for url, status in statuses.items():
+            if status is None or not 200 <= status < 400:
+                del accepted[url]
+                rejected.append((None, url, f"URL Status: {status}"))
+
+    # Save everything at once
+    if accepted:
+        add_urls((url, list(categories)) for url, categories in
+                accepted.items())
+
+    # Report the results
+    for url in accepted:
+        print(f"Accepted: {url}")
+    for line_number, url, reason in rejected:
+        location = "" if line_number is None else f"Line {line_number}: "
+        print(f"Rejected: {location}{url} -> {reason}")
+    print("-"*40)
+    print(f"Accepted: {len(accepted)} "\
+          f"({len([url for url in accepted if url in new_urls])} new)")
+    print(f"Rejected: {len(rejected)}")
+
+
+class TokenBucket:
+    def __init__(self, rate:float, capacity:int):
+        """Init for the TokenBucket object.
+        The purpose of this object is to limit how often requests are made to
+        a host, while still allowing short bursts of them.
+        Tokens are added at a steady rate, up to the capacity, and each
+        request has to take one.
+
+        Parameters
+        ----------
+        rate: float
+            The tokens added each second.
+        capacity: int
+            The most tokens that can be saved up.
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._last_refill = time.monotonic()
+
+
+    async def acquire(self) -> None:
+        """Wait until a token is available, then take it."""
+        while True:
+            # Add the tokens earned since the last refill
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                    self._tokens + (now - self._last_refill)*self.rate)
+            self._last_refill = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+            # Sleep until the next token is earned
+            await asyncio.sleep((1 - self._tokens)/self.rate)
+
+
+
+# How long to wait on a download before giving up on it
+_BACKUP_TIMEOUT = aiohttp.ClientTimeout(total=60)
+# Statuses worth trying again after a pause
+_RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# The size of the pieces downloads are written in
+_CHUNK_SIZE = 64*1024
+# The name of the file in a backup directory which records its backups
+BACKUP_MANIFEST = "manifest.json"
+# The name of the directory in a backup directory which stores the images,
+# each named after the SHA-256 of its content
+BACKUP_BLOBS = "blobs"
+
+
+class TooLarge(Exception):
+    """Raised when a download is bigger than it's allowed to be."""
+
+
+
+def _backup_file_name(url:str) -> str:
+    """Return the name the backup file of a url had before backups were
+    stored by their content."""
+    backup_file_name = "-".join(url.split("/"))
+    for bad_char in ["?", "/", ":", ".", "="]:
+        backup_file_name = backup_file_name.replace(bad_char, "-")
+    return backup_file_name
+
+
+def _hash_file(path:str) -> tuple:
+    """Return the SHA-256 hex digest and size of a file, reading it in chunks.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    with open(path, "rb") as fin:
+        for chunk in iter(lambda: fin.read(_CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            size += len(chunk)
+    return sha256.hexdigest(), size
+
+
+def blob_path(backup_dir:str, sha256:str) -> str:
+    """Return the path of the stored image with the given SHA-256.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    sha256: str
+        The SHA-256 hex digest of the image.
+
+    Returns
+    -------
+    str
+        The path of the image, which may not exist.
+    """
+    return os.path.join(backup_dir, BACKUP_BLOBS, sha256[:2], sha256)
+
+
+def backup_path(backup_dir:str, backup:dict) -> str:
+    """Return the path of the backup of a url.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    backup: dict
+        The manifest entry of the url.
+
+    Returns
+    -------
+    str
+        The path of the backup, which may not exist.
+    """
+    if "blob" in backup:
+        return blob_path(backup_dir, backup["blob"])
+    # Backed up before backups were stored by their content
+    return os.path.join(backup_dir, backup["file"])
+
+
+def _store_blob(backup_dir:str, path:str, sha256:str) -> None:
+    """Move a file into the store of images, replacing any identical copy.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    path: str
+        The path of the file to move.
+    sha256: str
+        The SHA-256 hex digest of the file.
+    """
+    stored_path = blob_path(backup_dir, sha256)
+    os.makedirs(os.path.dirname(stored_path), exist_ok=True)
+    os.replace(path, stored_path)
+
+
+def _migrate_backups(backup_dir:str, manifest:dict) -> None:
+    """Move the backups that were named after their url into the store of
+    images, and forget any whose file is gone.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    manifest: dict
+        The backup of each url, keyed by url, which is updated.
+    """
+    # Backed up before there was a manifest
+    for img in IMAGES:
+        path = os.path.join(backup_dir, _backup_file_name(img["url"]))
+        if img["url"] not in manifest and os.path.isfile(path):
+            sha256, size = _hash_file(path)
+            manifest[img["url"]] = {"file": _backup_file_name(img["url"]),
+                    "sha256": sha256, "size": size}
+    # Backed up before backups were stored by their content
+    for url, backup in list(manifest.items()):
+        if "file" not in backup:
+            continue
+        path = os.path.join(backup_dir, backup.pop("file"))
+        if os.path.isfile(path):
+            _store_blob(backup_dir, path, backup["sha256"])
+            backup["blob"] = backup["sha256"]
+        else:
+            del manifest[url]
+
+
+def _remove_orphan_blobs(backup_dir:str, manifest:dict) -> None:
+    """Delete the stored images that no url uses anymore.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    manifest: dict
+        The backup of each url, keyed by url.
+    """
+    used = {backup["blob"] for backup in manifest.values()}
+    for dir_path, _, file_names in os.walk(os.path.join(backup_dir,
+            BACKUP_BLOBS)):
+        for file_name in file_names:
+            if file_name not in used:
+                os.remove(os.path.join(dir_path, file_name))
+
+
+def load_manifest(backup_dir:str) -> dict:
+    """Load the manifest of a backup directory.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+
+    Returns
+    -------
+    dict
+        The backup of each url, keyed by url, or an empty dict if the
+        directory doesn't have a manifest yet.
+    """
+    manifest_path = os.path.join(backup_dir, BACKUP_MANIFEST)
+    if not os.path.isfile(manifest_path):
+        return dict()
+    with open(manifest_path) as fin:
+        return json.load(fin)
+
+
+def save_manifest(backup_dir:str, manifest:dict) -> None:
+    """Atomically replace the manifest of a backup directory.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    manifest: dict
+        The backup of each url, keyed by url.
+    """
+    manifest_path = os.path.join(backup_dir, BACKUP_MANIFEST)
+    with open(manifest_path + ".part", "w") as fout:
+        json.dump(manifest, fout, indent=1)
+    os.replace(manifest_path + ".part", manifest_path)
+
+
+async def _stream_to_blob(response:aiohttp.ClientResponse, backup_dir:str,
+        max_bytes:int) -> tuple:
+    """Stream the body of a response into the store of images, adding it to
+    the store only once the whole body has arrived.
+
+    Parameters
+    ----------
+    response: aiohttp.ClientResponse
+        The response to save the body of.
+    backup_dir: str
+        The path of the backup directory.
+    max_bytes: int
+        The largest body allowed.
+
+    Returns
+    -------
+    tuple
+        The SHA-256 hex digest and size of the body.
+
+    Raises
+    ------
+    TooLarge
+        Raised if the body is larger than max_bytes. Nothing is stored.
+    """
+    if response.content_length is not None and \
+            response.content_length > max_bytes:
+        raise TooLarge()
+    sha256 = hashlib.sha256()
+    size = 0
+    fd, part_path = tempfile.mkstemp(suffix=".part", dir=backup_dir)
+    try:
+        with os.fdopen(fd, "wb") as fout:
+            async for chunk in response.content.iter_chunked(_CHUNK_SIZE):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise TooLarge()
+                sha256.update(chunk)
+                fout.write(chunk)
+        _store_blob(backup_dir, part_path, sha256.hexdigest())
+    except BaseException:
+        # Never leave a partial file behind
+        if os.path.isfile(part_path):
+            os.remove(part_path)
+        raise
+    return sha256.hexdigest(), size
+
+
+async def _request(session:aiohttp.ClientSession, method:str, url:str,
+        bucket:TokenBucket, retries:int, backoff:float,
+        on_response:Callable[[aiohttp.ClientResponse], Awaitable[tuple]],
+        headers:dict=None) -> tuple:
+    """Make a request, trying again with growing pauses when the host is
+    overloaded or doesn't respond.
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+        The session to make the request with.
+    method: str
+        The HTTP method of the request.
+    url: str
+        The url to request.
+    bucket: TokenBucket
+        The rate limiter of the url's host.
+    retries: int
+        The most times to try again.
+    backoff: float
+        The seconds to wait before the first retry, doubling for each one
+        after.
+    on_response: Callable[[aiohttp.ClientResponse], Awaitable[tuple]]
+        Called with the final response, while it's still open.
+    headers: dict=None
+        Extra headers to send.
+
+    Returns
+    -------
+    tuple
+        The result of on_response, or None if the url never responded.
+    """
+    for attempt in range(retries + 1):
+        delay = backoff*2**attempt
+        await bucket.acquire()
+        try:
+            async with session.request(method, url, headers=headers,
+                    allow_redirects=True) as response:
+                if response.status in _RETRY_STATUSES and attempt < retries:
+                    # Honor the host's own pause, when it gives one
+                    retry_after = response.headers.get("Retry-After", "")
+                    if retry_after.isdigit():
+                        delay = max(delay, int(retry_after))
+                else:
+                    return await on_response(response)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            if attempt == retries:
+                return None
+        await asyncio.sleep(delay)
+
+
+async def _download(session:aiohttp.ClientSession, url:str,
+        backup_dir:str, bucket:TokenBucket, retries:int, backoff:float,
+        max_bytes:int, backup:dict=None) -> tuple:
+    """Download a url into the store of images. If the url was backed up
+    before then the download is conditional, and an unchanged image isn't
+    sent again.
+
+    Parameters
+    ----------
+    session: aiohttp.ClientSession
+        The session to download with.
+    url: str
+        The url to download.
+    backup_dir: str
+        The path of the backup directory.
+    bucket: TokenBucket
+        The rate limiter of the url's host.
+    retries: int
+        The most times to try again.
+    backoff: float
+        The seconds to wait before the first retry, doubling for each one
+        after.
+    max_bytes: int
+        The largest image allowed.
+    backup: dict=None
+        The manifest entry of the existing backup of the url.
+
+    Returns
+    -------
+    tuple
+        The HTTP status, or None if the url never responded, and the new
+        manifest entry of the url, which is None if nothing was saved.
+
+    Raises
+    ------
+    TooLarge
+        Raised if the image is larger than max_bytes.
+    """
+    headers = dict()
+    if backup is not None:
+        if backup.get("etag"):
+            headers["If-None-Match"] = backup["etag"]
+        if backup.get("last_modified"):
+            headers["If-Modified-Since"] = backup["last_modified"]
+
+    async def on_response(response:aiohttp.ClientResponse) -> tuple:
+        if not 200 <= response.status < 300:
+            return response.status, None
+        sha256, size = await _stream_to_blob(response, backup_dir, max_bytes)
+        return response.status, {
+                "blob": sha256,
+                "sha256": sha256,
+                "size": size,
+                "etag": response.headers.get("ETag"),
+                "last_modified": response.headers.get("Last-Modified"),
+                "content_length": response.content_length,
+                "content_type": _response_metadata(response).get(
+                    "content_type")
+                }
+
+    result = await _request(session, "GET", url, bucket, retries, backoff,
+            on_response, headers=headers)
+    return (None, None) if result is None else result
+
+
+async def _check_url(session:aiohttp.ClientSession, url:str,
+        bucket:TokenBucket, retries:int, backoff:float) -> Optional[int]:
+    """Return the HTTP status of a url without downloading it, falling back
+    to asking for only the first byte for servers that don't allow HEAD.
+    See _request for the parameters.
+    """
+    async def on_response(response:aiohttp.ClientResponse) -> tuple:
+        return (response.status,)
+
+    result = await _request(session, "HEAD", url, bucket, retries, backoff,
+            on_response)
+    if result is not None and result[0] in (405, 501):
+        result = await _request(session, "GET", url, bucket, retries,
+                backoff, on_response, headers={"Range": "bytes=0-0"})
+    return None if result is None else result[0]
+
+
+async def _backup_images(backup_dir:str, quiet:bool, refresh:bool,
+        check_only:bool, workers:int, rate:float, retries:int,
+        max_bytes:int) -> dict:
+    """Backup all the images to the given directory with a pool of workers.
+    See backup_images for the parameters.
+
+    Returns
+    -------
+    dict
+        The number of images that ended up with each outcome.
+    """
+    _ensure_loaded()
+    manifest = load_manifest(backup_dir)
+    if not check_only:
+        _migrate_backups(backup_dir, manifest)
+    queue = asyncio.Queue()
+    for img in IMAGES:
+        queue.put_nowait(img["url"])
+    total = queue.qsize()
+    if check_only:
+        summary = {"good": 0, "dead": 0}
+    else:
+        summary = {"downloaded": 0, "unchanged": 0, "skipped": 0,
+                "bad url": 0, "too large": 0, "failed": 0}
+    # Rate limiters of each host, keyed by host
+    buckets = dict()
+    # Metadata of the backed up images, keyed by url
+    found_metadata = dict()
+
+    def host_bucket(url:str) -> TokenBucket:
+        host = urlsplit(url).hostname
+        if host not in buckets:
+            buckets[host] = TokenBucket(rate, max(1, int(rate)))
+        return buckets[host]
+
+    async def check(session:aiohttp.ClientSession, url:str) -> None:
+        url_status = await _check_url(session, url, host_bucket(url),
+                retries, backoff=1.0)
+        url_good = url_status is not None and 200 <= url_status < 400
+        summary["good" if url_good else "dead"] += 1
+        if not(url_good and quiet):
+            done = sum(summary.values())
+            print(f"[{done}/{total}] {url}")
+            print(f"URL Status: {'Good' if url_good else 'Bad'} "\
+                  f"({url_status})")
+            print("-"*40)
+
+    async def backup(session:aiohttp.ClientSession, url:str) -> None:
+        backup = manifest.get(url)
+        backed_up = backup is not None and \
+                os.path.isfile(backup_path(backup_dir, backup))
+        url_status = None
+        # Skip images which are already backed up
+        if backed_up and not refresh:
+            outcome = "skipped"
+            backup_status = True
+        else:
+            outcome = None
+            try:
+                url_status, new_backup = await _download(session, url,
+                        backup_dir, host_bucket(url), retries, backoff=1.0,
+                        max_bytes=max_bytes,
+                        backup=backup if backed_up else None)
+            except TooLarge:
+                new_backup = None
+                outcome = "too large"
+            if new_backup is not None:
+                backup = manifest[url] = new_backup
+                outcome = "downloaded"
+                backup_status = True
+            else:
+                backup_status = backed_up
+                if url_status == 304 and backup_status:
+                    outcome = "unchanged"
+                elif outcome is None:
+                    outcome = "bad url" if backup_status else "failed"
+
+        # Describe the image, unless it already has been
+        if backup_status and (outcome == "downloaded" or
+                "width" not in URL_INDEX[url]["metadata"]):
+            metadata = _file_metadata(backup_path(backup_dir, backup))
+            if backup.get("content_type"):
+                metadata["content_type"] = backup["content_type"]
+            found_metadata[url] = metadata
+
+        # Output status if allowed
+        url_good = url_status is not None and 200 <= url_status < 400
+        summary[outcome] += 1
+        if not((url_good or outcome == "skipped") and backup_status and quiet):
+            done = sum(summary.values())
+            print(f"[{done}/{total}] {url}")
+            if outcome in ("skipped", "too large"):
+                print(f"URL Status: {outcome.capitalize()}")
+            else:
+                print(f"URL Status: {'Good' if url_good else 'Bad'} "\
+                      f"({url_status})")
+            if backup_status:
+                print(os.path.relpath(backup_path(backup_dir, backup),
+                    backup_dir))
+            print(f"Backup Status: {'Good' if backup_status else 'Bad'}")
+            print("-"*40)
+
+    async def worker(session:aiohttp.ClientSession) -> None:
+        while True:
+            try:
+                url = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            await (check if check_only else backup)(session, url)
+
+    try:
+        async with aiohttp.ClientSession(timeout=_BACKUP_TIMEOUT) as session:
+            await asyncio.gather(*(worker(session) for _ in range(workers)))
+        if not check_only:
+            # Drop the images that changed or whose urls were removed
+            for url in list(manifest):
+                if url not in URL_INDEX:
+                    del manifest[url]
+            _remove_orphan_blobs(backup_dir, manifest)
+    finally:
+        # Keep the record of everything that was backed up, even if stopped
+        if not check_only:
+            save_manifest(backup_dir, manifest)
+            record_metadata(found_metadata)
+    return summary
+
+
+def backup_images(backup_dir:str, quiet:bool=False, refresh:bool=False,
+        check_only:bool=False, workers:int=8, rate:float=2.0, retries:int=3,
+        max_bytes:int=16*1024*1024) -> None:
     """Backup all the images to the given directory.
+    Images are downloaded by a pool of workers, with the requests to each host
+    rate limited and retried with growing pauses when the host is overloaded.
+    Each image is streamed to disk and stored under its SHA-256, so that
+    identical images are only stored once. The content type, size, and
+    dimensions of each image, and rather it's animated, are saved in the
+    database of images. The manifest of the directory
+    maps each url to its image, along with its cache validators so that
+    refreshing a backup only downloads the image again if it has changed.
 
     Parameters
     ----------
@@ -117,43 +1945,78 @@ def backup_images(backup_dir:str, quiet:bool=False) -> None:
         If true then only when a URL does not work and/or backup
         file does not exist and cant' be created will information
         be printed to the console.
+    refresh: bool=False
+        If true then images that are already backed up are downloaded again
+        if they have changed, checking that their URLs still work.
+    check_only: bool=False
+        If true then nothing is downloaded, and the URLs are only checked.
+    workers: int=8
+        The most images to download at the same time.
+    rate: float=2.0
+        The most requests to make to each host every second.
+    retries: int=3
+        The most times to try a URL again after it fails.
+    max_bytes: int=16*1024*1024
+        The largest image to backup.
     """
     # Check if backup directory already exist
-    if not os.path.isdir(backup_dir):
+    if not os.path.isdir(backup_dir) and not check_only:
         # It doesn't exist, so make it
         os.mkdir(backup_dir)
-    
-    for img in IMAGES:
-        # Wait for a literal second
-        time.sleep(1)
-        # Check URL
-        response = requests.get(img["url"])
-
-        # Format the url into a proper file path
-        backup_file_name = "-".join(img['url'].split("/"))
-        for bad_char in ["?", "/", ":", ".", "="]:
-            backup_file_name = backup_file_name.replace(bad_char, "-")
-
-        # Check if backup exists
-        full_backup_path = os.path.join(backup_dir, backup_file_name)
-        if os.path.isfile(full_backup_path):
-            backup_status = True
+
+    start = time.monotonic()
+    summary = asyncio.run(_backup_images(backup_dir, quiet, refresh,
+        check_only, workers, rate, retries, max_bytes))
+    # Summarize the backup
+    print(", ".join(f"{outcome.capitalize()}: {count}" for outcome, count in
+        summary.items()) + f" ({time.monotonic() - start:.1f}s)")
+
+
+def verify_backups(backup_dir:str, quiet:bool=False) -> bool:
+    """Check the backups in the given directory against its manifest, without
+    using the network.
+
+    Parameters
+    ----------
+    backup_dir: str
+        The path of the backup directory.
+    quiet: bool=False
+        If true then only backups that are missing or corrupt will be
+        printed to the console.
+
+    Returns
+    -------
+    bool
+        Rather every backup matched the manifest.
+    """
+    manifest = load_manifest(backup_dir)
+    summary = {"good": 0, "missing": 0, "corrupt": 0}
+    # Hash of each stored image, so images used by many urls are read once
+    hashes = dict()
+    for url, backup in manifest.items():
+        path = backup_path(backup_dir, backup)
+        if path not in hashes:
+            hashes[path] = _hash_file(path) if os.path.isfile(path) else None
+        if hashes[path] is None:
+            outcome = "missing"
+        elif hashes[path] != (backup["sha256"], backup["size"]):
+            outcome = "corrupt"
         else:
-            if not response.ok:
-                backup_status = False
-            else:
-                with open(full_backup_path, "wb") as handler:
-                    handler.write(response.content)
-                backup_status = True
-      
+            outcome = "good"
+        summary[outcome] += 1
+
         # Output status if allowed
-        if not(response.ok and backup_status and quiet):
-            print(img["url"])
-            print(f"URL Status: {'Good' if response.ok else 'Bad'}")
-            print(backup_file_name)
-            print(f"Backup Status: {'Good' if backup_status else 'Bad'}")
+        if not(outcome == "good" and quiet):
+            print(url)
+            print(os.path.relpath(path, backup_dir))
+            print(f"Backup Status: {outcome.capitalize()}")
             print("-"*40)
 
+    # Summarize the verification
+    print(", ".join(f"{outcome.capitalize()}: {count}" for outcome, count in
+        summary.items()))
+    return summary["good"] == len(manifest)
+
 
 def parse_arguments(args=None) -> None:
     """Returns the parsed arguments.
@@ -180,18 +2043,80 @@ def parse_arguments(args=None) -> None:
             help="The categories this image is in")
     parser_add.set_defaults(func=add_url)
 
+    # Create parser for the import command
+    parser_import = subparsers.add_parser("import",
+            help="Add many images to Dadbot's collection at once")
+    parser_import.add_argument("source",
+            help="The CSV or JSONL file to import, or - for stdin. "\
+                 "CSV lines are a url followed by its categories. "\
+                 "JSONL lines are objects with a url and a list of "\
+                 "categories.")
+    parser_import.add_argument("-f", "--format", dest="file_format",
+            choices=("csv", "jsonl"), default=None,
+            help="The format of the source. Taken from the file extension "\
+                 "by default.")
+    parser_import.add_argument("-c", "--concurrency", type=int, default=8,
+            help="The most urls to check at the same time.")
+    parser_import.add_argument("--skip-validation", default=False,
+            action="store_true",
+            help="Add new urls without checking them.")
+    parser_import.set_defaults(func=import_images)
+
+    # Create parser for the dedupe command
+    parser_dedupe = subparsers.add_parser("dedupe",
+            help="Combine images whose urls only differ in ways that don't "\
+                 "change the image")
+    parser_dedupe.add_argument("-n", "--dry-run", default=False,
+            action="store_true",
+            help="Only report the duplicates.")
+    parser_dedupe.set_defaults(func=dedupe_images)
+
+    # Create parser for the export command
+    parser_export = subparsers.add_parser("export",
+            help="Export Dad's image collection to json")
+    parser_export.add_argument("json_path", nargs="?", default=IMAGES_JSON,
+            help="The json file to export to.")
+    parser_export.set_defaults(func=export_images)
+
     # Create parser for the backup command
     parser_add = subparsers.add_parser("backup",
             help="Backup Dad's image collection. "\
-                 "Will also check if URLs for backed up images are still "\
-                 "valid.")
+                 "With --refresh will also check if URLs for backed up "\
+                 "images are still valid.")
     parser_add.add_argument("backup_dir",
             help="The file directory to backup the images to.")
     parser_add.add_argument("-q", "--quiet", default=False,
             action="store_true",
             help="Limit output to failed images.")
+    parser_add.add_argument("--refresh", default=False,
+            action="store_true",
+            help="Download images that are already backed up again, "\
+                 "if they have changed.")
+    parser_add.add_argument("--check-only", default=False,
+            action="store_true",
+            help="Only check that the URLs still work, without "\
+                 "downloading anything.")
+    parser_add.add_argument("-w", "--workers", type=int, default=8,
+            help="The most images to download at the same time.")
+    parser_add.add_argument("-r", "--rate", type=float, default=2.0,
+            help="The most requests to make to each host every second.")
+    parser_add.add_argument("--retries", type=int, default=3,
+            help="The most times to try a URL again after it fails.")
+    parser_add.add_argument("--max-bytes", type=int, default=16*1024*1024,
+            help="The largest image to backup.")
     parser_add.set_defaults(func=backup_images)
 
+    # Create parser for the verify command
+    parser_verify = subparsers.add_parser("verify",
+            help="Check Dad's backed up images against the backup's "\
+                 "manifest, without using the network.")
+    parser_verify.add_argument("backup_dir",
+            help="The file directory the images were backed up to.")
+    parser_verify.add_argument("-q", "--quiet", default=False,
+            action="store_true",
+            help="Limit output to missing and corrupt backups.")
+    parser_verify.set_defaults(func=verify_backups)
+
     # Parse arguments
     args = parser.parse_args(args=args)
 
@@ -205,7 +2130,6 @@ def parse_arguments(args=None) -> None:
 
 # Execute only if this file is being run as the entry file.
 if __name__ == "__main__":
-    import sys
     args = parse_arguments()
     try:
         if args is not None:
@@ -213,7 +2137,9 @@ if __name__ == "__main__":
             func = args.func
             del args.func
             # Give all other arguments to the selected subcommand
-            func(**vars(args))
+            # A subcommand returning False means it found problems
+            if func(**vars(args)) is False:
+                sys.exit(1)
         sys.exit(0)
     except FileNotFoundError as exp:
         print(exp, file=sys.stderr)
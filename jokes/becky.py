@@ -25,6 +25,7 @@ class BeckyJoke(Joke):
         ]
         becky_phrase_re = "|".join(becky_phrase)
         self.becky_re = re.compile(becky_phrase_re, re.IGNORECASE)
+        self.triggers = [becky_phrase_re]
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
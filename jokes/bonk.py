@@ -5,7 +5,7 @@ from redbot.core.bot import Red
 
 from .joke import Joke
 from .favoritism import FavoritismJoke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class BonkJoke(Joke):
@@ -23,6 +23,7 @@ class BonkJoke(Joke):
             "bonk",
         ]
         self.bonk_re = re.compile("|".join(bonk_phrases), re.IGNORECASE)
+        self.triggers = bonk_phrases
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -51,9 +52,9 @@ class BonkJoke(Joke):
             response = {"title":"BONK!"}
             # Construct embed
             embed = discord.Embed.from_dict(response)
-            embed.set_image(url=random_image_url_in_category("bonk"))
+            image = await set_embed_image(embed, "bonk", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
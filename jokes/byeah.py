@@ -28,6 +28,7 @@ class ByeahJoke(Joke):
                 "doughnut"
                 ]
         self.byeah_re = re.compile("|".join(byeah_items), re.IGNORECASE)
+        self.triggers = byeah_items
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
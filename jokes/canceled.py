@@ -5,7 +5,7 @@ from redbot.core.bot import Red
 
 from .joke import Joke
 from .favoritism import FavoritismJoke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class CanceledJoke(Joke):
@@ -72,6 +72,8 @@ class CanceledJoke(Joke):
         # Cancel them
         counter = await bot._conf.member(canceled_user).cancel_counter()
         await bot._conf.member(canceled_user).cancel_counter.set(counter + 1)
+        standings = await bot.standings.get(canceled_user.guild)
+        standings.cancel_counters.update(canceled_user.id, counter + 1)
         cls.log_info(canceled_user.guild, canceled_user, 
                 f"Cancelled {canceled_user.display_name} by DadBot")
         # Punish the canceled member
@@ -81,6 +83,6 @@ class CanceledJoke(Joke):
             await FavoritismJoke.add_points_to_member(bot, canceler, -10)
         # Send the message
         embed = discord.Embed.from_dict(contents)
-        embed.set_image(url=random_image_url_in_category("cancelled"))
-        await channel.send(embed=embed)
+        image = await set_embed_image(embed, "cancelled", channel.guild.id)
+        await channel.send(embed=embed, file=image)
 
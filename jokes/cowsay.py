@@ -1,42 +1,360 @@
+import asyncio
+from collections import OrderedDict
 import discord
 import logging
+import os
 import random
 import re
 from redbot.core.bot import Red
-import subprocess
+import shutil
+from string import Template
+import textwrap
+from typing import FrozenSet, Iterable, List, Optional, Tuple
 
 from .joke import Joke
 
 
+# Where cow files are looked for when COWPATH isn't set
+_DEFAULT_COW_PATHS = (
+        "/usr/share/cowsay/cows",
+        "/usr/share/cows",
+        "/usr/local/share/cows",
+        "/usr/local/share/cowsay/cows",
+        "/opt/homebrew/share/cows",
+        )
+# The longest message Discord allows
+DISCORD_MESSAGE_LIMIT = 2000
+# Used when no default.cow is installed
+_DEFAULT_COW = """\
+        $thoughts   ^__^
+         $thoughts  ($eyes)\\_______
+            (__)\\       )\\/\\
+             $tongue ||----w |
+                ||     ||
+"""
+# The start of the cow in a cow file, and the word that ends it
+_HEREDOC_RE = re.compile(
+        r"""\$the_cow\s*=\s*<<\s*(?P<quote>["']?)(?P<end>\w+)(?P=quote)\s*;"""
+        r"""[^\n]*\n""")
+# Variables a cow file sets for itself, such as its own eyes
+_ASSIGNMENT_RE = re.compile(
+        r"""^\s*\$(?P<name>\w+)\s*=\s*(?P<quote>["'])(?P<value>.*?)"""
+        r"""(?P=quote)\s*;""", re.MULTILINE)
+
+
+def _unescape(text:str) -> str:
+    """Return the text of a double quoted Perl string as a Template string.
+    Escaped characters lose their backslash, and escaped dollar signs become
+    the $$ of a Template."""
+    def replace(match:re.Match) -> str:
+        char = match.group(1)
+        return {"n": "\n", "t": "\t", "$": "$$"}.get(char, char)
+    return re.sub(r"\\(.)", replace, text, flags=re.DOTALL)
+
+
+def parse_cow(source:str) -> Optional[tuple]:
+    """Parse the text of a cow file.
+
+    Parameters
+    ----------
+    source: str
+        The text of the cow file.
+
+    Returns
+    -------
+    Optional[tuple]
+        The Template of the cow and the variables the cow sets for itself, or
+        None if the cow couldn't be understood.
+    """
+    match = _HEREDOC_RE.search(source)
+    if match is None:
+        return None
+    end = source.find(f"\n{match.group('end')}\n", match.end() - 1)
+    if end == -1:
+        # The end word may be the last line without a newline
+        if not source.rstrip().endswith(f"\n{match.group('end')}"):
+            return None
+        end = source.rstrip().rfind("\n")
+    body = source[match.end():end + 1]
+    variables = dict()
+    for assignment in _ASSIGNMENT_RE.finditer(source[:match.start()]):
+        value = assignment.group("value")
+        if assignment.group("quote") == '"':
+            value = Template(_unescape(value)).safe_substitute()
+        variables[assignment.group("name")] = value
+    if match.group("quote") == "'":
+        # Nothing is interpolated in single quoted heredocs
+        return Template(body.replace("$", "$$")), variables
+    return Template(_unescape(body)), variables
+
+
+
+class CowSay:
+    def __init__(self, cow_paths:Iterable[str]=None):
+        """Init for the CowSay object.
+        The purpose of this object is to draw cowsays without running the
+        cowsay program. Every cow file is parsed once, here, into a Template
+        which only needs its eyes, tongue, and thoughts filled in to draw it.
+        Cows that can't be parsed are remembered, so that the cowsay program
+        can draw them instead, if it's installed.
+
+        Parameters
+        ----------
+        cow_paths: Iterable[str]=None
+            The directories to look for cow files in. By default COWPATH is
+            used if it's set, otherwise the usual places cowsay is installed.
+        """
+        if cow_paths is None:
+            cow_path = os.environ.get("COWPATH")
+            cow_paths = cow_path.split(os.pathsep) if cow_path else \
+                    _DEFAULT_COW_PATHS
+        self.cows = dict()
+        self.unparsed = set()
+        for cow_dir in cow_paths:
+            if not os.path.isdir(cow_dir):
+                continue
+            for file_name in sorted(os.listdir(cow_dir)):
+                name, ext = os.path.splitext(file_name)
+                if ext != ".cow" or name in self.cows:
+                    continue
+                try:
+                    with open(os.path.join(cow_dir, file_name),
+                            encoding="utf-8", errors="replace") as fin:
+                        cow = parse_cow(fin.read())
+                except OSError:
+                    cow = None
+                if cow is None:
+                    self.unparsed.add(name)
+                else:
+                    self.cows[name] = cow
+                    self.unparsed.discard(name)
+        self.cows.setdefault("default", (Template(_DEFAULT_COW), dict()))
+
+
+    def characters(self) -> List[str]:
+        """Return the names of the cows that can be drawn"""
+        return list(self.cows)
+
+
+    @staticmethod
+    def bubble(message:str, width:int=40) -> str:
+        """Return the message wrapped in a speech bubble.
+
+        Parameters
+        ----------
+        message: str
+            The message to put in the bubble.
+        width: int=40
+            The longest line before the message is wrapped.
+
+        Returns
+        -------
+        str
+            The speech bubble.
+        """
+        lines = []
+        for line in message.expandtabs().split("\n"):
+            lines.extend(textwrap.wrap(line, width) or [""])
+        longest = max(len(line) for line in lines)
+        if len(lines) == 1:
+            borders = [("<", ">")]
+        else:
+            borders = [("/", "\\")] + [("|", "|")]*(len(lines) - 2) + \
+                    [("\\", "/")]
+        return "\n".join([" " + "_"*(longest + 2)] +
+                [f"{left} {line.ljust(longest)} {right}" for
+                    line, (left, right) in zip(lines, borders)] +
+                [" " + "-"*(longest + 2)]) + "\n"
+
+
+    def render(self, name:str, message:str, eyes:str="oo",
+            tongue:str="  ") -> str:
+        """Return a drawing of a cow saying the message.
+
+        Parameters
+        ----------
+        name: str
+            The name of the cow.
+        message: str
+            The message the cow says.
+        eyes: str="oo"
+            The eyes of the cow, unless the cow has its own.
+        tongue: str="  "
+            The tongue of the cow, unless the cow has its own.
+
+        Returns
+        -------
+        str
+            The drawing.
+
+        Raises
+        ------
+        KeyError
+            Raised if there is no cow with the name.
+        """
+        template, variables = self.cows[name]
+        values = {"eyes": eyes, "tongue": tongue, "thoughts": "\\"}
+        values.update(variables)
+        return self.bubble(message) + template.safe_substitute(values)
+
+
+    def render_code_block(self, name:str, message:str,
+            limit:int=DISCORD_MESSAGE_LIMIT) -> str:
+        """Return a drawing of a cow saying the message, in a code block that
+        fits in a Discord message. Messages too long to fit are cut short.
+
+        Parameters
+        ----------
+        name: str
+            The name of the cow.
+        message: str
+            The message the cow says.
+        limit: int=DISCORD_MESSAGE_LIMIT
+            The longest the code block can be.
+
+        Returns
+        -------
+        str
+            The code block.
+
+        Raises
+        ------
+        KeyError
+            Raised if there is no cow with the name.
+        """
+        # Don't let the message close the code block early
+        message = message.replace("```", "ˋˋˋ")
+        drawing = self.render(name, message)
+        if len(drawing) + 6 <= limit:
+            return f"```{drawing}```"
+        # Find the longest start of the message that fits
+        low, high = 0, len(message)
+        while low < high:
+            mid = (low + high + 1)//2
+            if len(self.render(name, message[:mid] + "...")) + 6 <= limit:
+                low = mid
+            else:
+                high = mid - 1
+        return f"```{self.render(name, message[:low] + '...')}```"
+
+
+    @staticmethod
+    def fit_code_block(text:str, limit:int=DISCORD_MESSAGE_LIMIT) -> str:
+        """Return text, such as from the cowsay program, in a code block that
+        fits in a Discord message, cutting off the end if it doesn't fit."""
+        if len(text) + 6 > limit:
+            text = text[:limit - 6]
+        return f"```{text}```"
+
+
+
+# Loaded by the first CowSayJoke, see _engine
+_ENGINE = None
+# The names of every character, computed once by _characters
+_CHARACTERS = None
+_CHARACTER_SET = None
+# The most cowsay programs to run at once, and how long to wait on one
+_MAX_PROCESSES = 4
+_PROCESS_TIMEOUT = 5
+# Made on first use so that it belongs to the bot's event loop
+_PROCESS_SEMAPHORE = None
+# The most recent cowsays, keyed by (character, message)
+_OUTPUT_CACHE = OrderedDict()
+_OUTPUT_CACHE_SIZE = 256
+
+
+def _engine() -> CowSay:
+    """Return the shared CowSay, loading the cow files the first time."""
+    global _ENGINE
+    if _ENGINE is None:
+        _ENGINE = CowSay()
+    return _ENGINE
+
+
+def _characters() -> Tuple[List[str], FrozenSet[str]]:
+    """Return the names of every character, as a list and a set, computing
+    them the first time. The cowsay program can draw the cows that the engine
+    couldn't parse, if it's installed."""
+    global _CHARACTERS, _CHARACTER_SET
+    if _CHARACTERS is None:
+        engine = _engine()
+        characters = engine.characters()
+        if engine.unparsed and shutil.which("cowsay"):
+            characters.extend(sorted(engine.unparsed))
+        _CHARACTERS = characters
+        _CHARACTER_SET = frozenset(characters)
+    return _CHARACTERS, _CHARACTER_SET
+
+
+async def run_cowsay(name:str, message:str) -> Optional[str]:
+    """Run the cowsay program without blocking the event loop.
+    Only a few run at once, and any that take too long are killed.
+
+    Parameters
+    ----------
+    name: str
+        The name of the character to draw.
+    message: str
+        The message the character says.
+
+    Returns
+    -------
+    Optional[str]
+        The output of cowsay, or None if it failed or took too long.
+    """
+    global _PROCESS_SEMAPHORE
+    if _PROCESS_SEMAPHORE is None:
+        _PROCESS_SEMAPHORE = asyncio.Semaphore(_MAX_PROCESSES)
+    async with _PROCESS_SEMAPHORE:
+        proc = await asyncio.create_subprocess_exec("cowsay", "-f", name,
+                message, stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE)
+        try:
+            stdout, stderr = await asyncio.wait_for(proc.communicate(),
+                    _PROCESS_TIMEOUT)
+        except asyncio.TimeoutError:
+            proc.kill()
+            await proc.wait()
+            CowSayJoke.log_error(None, None, f"Cowsay timed out on {name}")
+            return None
+    if proc.returncode != 0:
+        CowSayJoke.log_error(None, None, stderr)
+        return None
+    return stdout.decode("utf-8")
+
+
 class CowSayJoke(Joke):
     def __init__(self):
         """Init for the Cowsay joke.
 
         Cowsay is a program that generates an ASCII art cow with a speech
-        bubble containing user provided text. This is an incomplete recreation 
+        bubble containing user provided text. This is an incomplete recreation
         of that program in Python for Discord.
+        The cow files are parsed once, here, and drawn without running the
+        cowsay program, which is only used for cows that can't be parsed.
         """
         # Set up super class
         super().__init__("cowsay", 1.0)
         # Set up this class
+        self.engine = _engine()
 
 
     @staticmethod
     def cowsay_characters() -> list:
         """Return the list of cowsay characters"""
-        res = subprocess.run(("cowsay", "-l"), capture_output=True)
-        # Remove the first line of "Cow files in /usr/share/cows:"
-        lines_of_cows = res.stdout.decode("utf-8").split("\n")[1:]
-        # Break up each line of cow files into a single string
-        cows = []
-        for l in lines_of_cows:
-            cows.extend(l.split())
-        return cows
+        return list(_characters()[0])
 
 
     @staticmethod
-    def construct_cowsay(name:str, message:str) -> str:
+    def is_cowsay_character(name:str) -> bool:
+        """Return rather there is a cowsay character with the name"""
+        return name in _characters()[1]
+
+
+    @staticmethod
+    async def construct_cowsay(name:str, message:str) -> str:
         """Return a random constructed cowsay
+        Recent cowsays are remembered, so repeating one is free.
 
         Parameters
         ----------
@@ -50,13 +368,29 @@ class CowSayJoke(Joke):
         str
             The cowsayed message.
         """
-        res = subprocess.run(("cowsay", "-f", name, message), 
-                capture_output=True)
-        if res.returncode == 0:
-            return f"```{res.stdout.decode('utf-8')}```"
+        key = (name, message)
+        cowsay = _OUTPUT_CACHE.get(key)
+        if cowsay is not None:
+            _OUTPUT_CACHE.move_to_end(key)
+            return cowsay
+
+        engine = _engine()
+        if name in engine.cows:
+            cowsay = engine.render_code_block(name, message)
+        elif not shutil.which("cowsay"):
+            cowsay = engine.render_code_block("default", message)
         else:
-            CowSayJoke.log_error(None, None, res.stderr)
-            return "Cowsay failed to run, contact administrator"
+            # Fall back on the cowsay program
+            output = await run_cowsay(name, message)
+            if output is None:
+                # Don't remember failures, they may not happen again
+                return "Cowsay failed to run, contact administrator"
+            cowsay = engine.fit_code_block(output)
+
+        _OUTPUT_CACHE[key] = cowsay
+        if len(_OUTPUT_CACHE) > _OUTPUT_CACHE_SIZE:
+            _OUTPUT_CACHE.popitem(last=False)
+        return cowsay
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -76,11 +410,10 @@ class CowSayJoke(Joke):
         """
         # Get the constructed cowsay and name
         name = random.choice(self.cowsay_characters())
-        cowsay = self.construct_cowsay(name, msg.content)
+        cowsay = await self.construct_cowsay(name, msg.content)
         # Log joke
         self.log_info(msg.guild, msg.author, name)
         # Send message
         await msg.channel.send(cowsay)
         # Return success
         return True
-
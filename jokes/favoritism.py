@@ -303,13 +303,23 @@ class FavoritismJoke(Joke):
         points: int
             Points to add. Note the points "added" can be negative.
         """
-        # Get current points
-        current_points = await bot._conf.member(member).points()
-        # Set new points
-        await bot._conf.member(member).points.set(current_points + points)
-        # Log points change
-        cls.log_info(member.guild, member, 
-                f"{current_points}->{current_points + points}")
+        # Bots can't be children, so they aren't in the standings
+        if member.bot:
+            # Set new points, they will be saved with the next flush
+            bot.points_ledger.add(member, points)
+            cls.log_info(member.guild, member, f"{points:+}")
+        else:
+            # Get current points from the standings, which already include
+            # the unwritten changes, rather than reading them from storage
+            standings = await bot.standings.get(member.guild)
+            current_points = standings.points.value(member.id)
+            # Set new points, they will be saved with the next flush
+            bot.points_ledger.add(member, points)
+            # Log points change
+            cls.log_info(member.guild, member, 
+                    f"{current_points}->{current_points + points}")
+            # Update the standings
+            standings.points.update(member.id, current_points + points)
         # Recalculate favorite child for the associated guild
         await cls.calculate_favoritism_in_guild(bot, member.guild)
 
@@ -318,6 +328,7 @@ class FavoritismJoke(Joke):
     async def calculate_favoritism_in_guild(cls, bot:Red, guild:discord.Guild)\
             -> None:
         """Calculates the favorite child in a guild
+        The favorite and hated child are only saved if they changed.
 
         Parameters
         ----------
@@ -328,39 +339,24 @@ class FavoritismJoke(Joke):
         Returns
         -------
         """
-        # Initialize our starting values
-        max_points = 0
-        favorite_child = None
-        least_points = 0
-        hated_child = None
-        for member in guild.members:
-            if not member.bot:
-                points = await bot._conf.member(member).points()
-                if points != 0:
-                    if points > max_points:
-                        max_points = points
-                        favorite_child = member
-                    if points < least_points:
-                        least_points = points
-                        hated_child = member
+        standings = await bot.standings.get(guild)
 
         # Save the favorite child 
-        if favorite_child is not None:
-            await bot._conf.guild(guild).favorite_child.set(
-                    favorite_child.id)
-        else:
-            await bot._conf.guild(guild).favorite_child.set(None)
-        # Log recalculation of favorite child
-        cls.log_info(guild, favorite_child, "Current favorite child")
+        favorite_id = standings.favorite()
+        if favorite_id != await cls.get_guild_option(bot, guild,
+                "favorite_child"):
+            await bot.guild_settings.set(guild, "favorite_child", favorite_id)
+            # Log recalculation of favorite child
+            cls.log_info(guild, guild.get_member(favorite_id)
+                    if favorite_id else None, "Current favorite child")
 
         # Save the hated child 
-        if hated_child is not None:
-            await bot._conf.guild(guild).hated_child.set(
-                    hated_child.id)
-        else:
-            await bot._conf.guild(guild).hated_child.set(None)
-        # Log recalculation of hated child
-        cls.log_info(guild, hated_child, "Current hated child")
+        hated_id = standings.hated()
+        if hated_id != await cls.get_guild_option(bot, guild, "hated_child"):
+            await bot.guild_settings.set(guild, "hated_child", hated_id)
+            # Log recalculation of hated child
+            cls.log_info(guild, guild.get_member(hated_id)
+                    if hated_id else None, "Current hated child")
 
 
     @classmethod
@@ -410,7 +406,7 @@ class FavoritismJoke(Joke):
             The guild to determine the favorite child of.
         """
         # Get the favorite child of the guild
-        fav_id = await bot._conf.guild(guild).favorite_child()
+        fav_id = await cls.get_guild_option(bot, guild, "favorite_child")
         if fav_id is None:
             return False
         else:
@@ -432,7 +428,7 @@ class FavoritismJoke(Joke):
             The guild to determine the hated child of.
         """
         # Get the hate child of the guild
-        hate_id = await bot._conf.guild(guild).hated_child()
+        hate_id = await cls.get_guild_option(bot, guild, "hated_child")
         if hate_id is None:
             return False
         else:
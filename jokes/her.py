@@ -1,9 +1,9 @@
 import discord
 import logging
-import re
 from redbot.core.bot import Red
 
 from .joke import Joke
+from .matchers import her_stem
 
 
 class HerJoke(Joke):
@@ -18,11 +18,8 @@ class HerJoke(Joke):
         """
         # Set up super class
         super().__init__("her", 5.0)
-        # Set up this class
-        self.her_re = re.compile(
-                    r".*(?P<her>\b((\w*[^h])|(\w+h))er[s]?\b).*", 
-                    re.IGNORECASE
-                )
+        # Every "her" word ends in "er" or "ers"
+        self.triggers = [r"ers?\b"]
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -38,24 +35,22 @@ class HerJoke(Joke):
         bool
             Rather the joke was made or not.
         """
-        her_match = self.her_re.match(msg.content)
+        stem = her_stem(msg.content)
 
-        if her_match is None:
+        if stem is None:
             # No joke was possible, stop
             return False
         else:
-            # Chuck the pattern, keep the match
-            _her = her_match.groups("her")[1]
+            _her = stem
             # Check if last letter is h
             if _her[-1].lower() == 'h':
                 _her = _her[:-1]
             # Check if the "her" word will make our message too long # (> 2000 characters)
             if len(_her) > 1960:
                 # Replace part of middle with ellipse
-                _her = f"{_her[:(1960/2-20)]}...{_her[(1960/2+20):]}"
+                _her = f"{_her[:(1960//2-20)]}...{_her[-(1960//2-20):]}"
             # Log joke
-            self.log_info(msg.guild, msg.author, 
-                    f"{her_match.groups('her')[1]}")
+            self.log_info(msg.guild, msg.author, stem)
             # Construct our response
             response = f"{_her.title()}*her*, I barely know her!"
             # Send message
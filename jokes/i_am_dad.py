@@ -1,9 +1,10 @@
 import discord
 import logging
-import re
 from redbot.core.bot import Red
+from typing import Optional, Tuple
 
 from .joke import Joke
+from .matchers import find_i_am
 from .util import Option, OptionType
 
 
@@ -23,20 +24,18 @@ class IAmDadJoke(Joke):
         original author of Dad got in an arms race of using visually similar
         versions of "I'm" and detecting said versions.
         The result has unintended consequences of odd sets of characters being
-        interpreted as a valid "I'm" variation.
+        interpreted as a valid "I'm" variation. The variations are kept in
+        matchers.I_VARIANTS and matchers.M_VARIANTS.
         This has been deemed a feature, and not a bug.
         """
         # Set up super class
         super().__init__("i_am_dad", 5.0)
-        # Set up this class
-        i_variants = r"ℹ️ⁱîỉᶧĨꟷḭꞮᶤÌ𐌉İᵢIⲓǏł1ꞼȉlịḯꞽĪıᵻ ǐіɨ́̃ĬȋḮĩįɪÎᶦ𐤉ìỈІ𐌹¡ꟾÍᴉ|ïí̀Ȋᵎ"\
-                r"Ⲓ ιȈᴵΙḬỊiᛁÏĭīΐϊίΓाjƗ"
-        m_variants = r"ꟽℳ₥𐌼Ɯ𐤌mΜṃɯᶭṁⲘṂⱮⲙḾᵯₘMɱꟺḿꬺ™Мᵚᴹмɰᵐᴟᶆᴍ𐌌ᛗμᶬṀꟿ̃℠ल♏️"
-        self.iam_re = re.compile(
-                    f"(?P<iam>\\b[{i_variants}]\\W*[ae]*[{m_variants}]\\b)" \
-                         f"\\s*(?P<name>.*)", 
-                    re.IGNORECASE
-                )
+        # Set up this class, the variants are found by folding the message
+        # rather than with a regular expression of every variant
+        self.trigger_matcher = self.has_i_am
+        # The last content searched and its "I'm", so a message that passes
+        # the trigger isn't folded again to make the joke
+        self._last_search = (None, None)
         # Set up options
         self.guild_options.append(
                 Option(
@@ -46,6 +45,44 @@ class IAmDadJoke(Joke):
             )
 
 
+    def find_i_am(self, content:str) -> Optional[Tuple[str, str]]:
+        """Return the "I'm" and name in the content, as matchers.find_i_am
+        does, reusing the result if the content was the last searched.
+
+        Parameters
+        ----------
+        content: str
+            The message contents to search.
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            The "I'm" and the name after it, or None if there is no "I'm".
+        """
+        last_content, last_match = self._last_search
+        if content == last_content:
+            return last_match
+        match = find_i_am(content)
+        self._last_search = (content, match)
+        return match
+
+
+    def has_i_am(self, content:str) -> bool:
+        """Return rather the content has an "I'm" in it.
+
+        Parameters
+        ----------
+        content: str
+            The message contents to check.
+
+        Returns
+        -------
+        bool
+            Rather there is an "I'm", in any of its variants.
+        """
+        return self.find_i_am(content) is not None
+
+
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
         """Make an "I'm Dad" joke, return success as bool
         Parameters
@@ -59,14 +96,14 @@ class IAmDadJoke(Joke):
         bool
             Rather the joke was made or not.
         """
-        match = self.iam_re.search(msg.content)
+        match = self.find_i_am(msg.content)
         if match is None:
             # No joke was possible, stop
             return False
         else:
-            their_name = match.group("name")
+            iam, their_name = match
             # Check if we can attempt to rename the author
-            if await self.get_guild_option(bot, msg.channel, 
+            if await self.get_guild_option(bot, msg.guild, 
                     f"{self.name}_change_nickname"):
                 their_name = await self.update_sons_nickname(msg.author,
                         their_name)
@@ -76,10 +113,10 @@ class IAmDadJoke(Joke):
             if len(their_name) > 1975:
                 their_name = f"{their_name[:1975]}..."
             # Construct our response
-            response = f"Hello \"{their_name}\", {match.group('iam')} Dad!"
+            response = f"Hello \"{their_name}\", {iam} Dad!"
             # Log joke
             self.log_info(msg.guild, msg.author, 
-                    f"{match.group('iam')} {their_name}"
+                    f"{iam} {their_name}"
                     )
             # Send message
             await msg.channel.send(response)
@@ -62,6 +62,15 @@ class Joke(ABC):
         time this class also uses the Option class to generalize creating that 
         setting for each guild. It has been setup so that Jokes can create 
         other options if needed.
+        Sub-classes that only apply when a message contains certain text should
+        set self.triggers to a list of regular expressions, so that Dad can
+        skip them for messages that can't contain the joke. Sub-classes that
+        need one of a set of words can set self.trigger_words to the set of
+        lower case words instead, which is cheaper to check. Sub-classes whose
+        text can't be found cheaply with either can set self.trigger_matcher
+        to a function that takes the message content and returns rather the
+        joke could apply. The default of None for all three means the joke
+        applies to every message.
         Parameters
         ----------
         name: str
@@ -77,9 +86,13 @@ class Joke(ABC):
         self.name = name
         # Set up options
         self.guild_options = [
-                Option(f"{self.name}_chance", default_chance, 
+                Option(f"{self.name}_chance", default_chance,
                     OptionType.PERCENTAGE)
                 ]
+        # Set up triggers
+        self.triggers = None
+        self.trigger_words = None
+        self.trigger_matcher = None
 
 
     async def make_verbal_joke(self, bot:Red, msg:discord.Message) -> bool:
@@ -196,6 +209,17 @@ class Joke(ABC):
             guild_options_information[opt.name] = opt
 
 
+    def register_triggers(self, trigger_index:"TriggerIndex") -> None:
+        """Declares the triggers of this joke to the given index.
+        Parameters
+        ----------
+        trigger_index: TriggerIndex
+            The index which Dad uses to find candidate jokes for a message.
+        """
+        trigger_index.add(self, self.triggers, self.trigger_words,
+                self.trigger_matcher)
+
+
     @staticmethod
     async def get_guild_option(bot: Red, guild:discord.Guild,
             option_name: str) -> any:
@@ -218,8 +242,8 @@ class Joke(ABC):
             Raised if the given option_name does not exist
         """
         try:
-            return await getattr(bot._conf.guild(guild), option_name)()
-        except AttributeError:
+            return await bot.guild_settings.get(guild, option_name)
+        except KeyError:
             raise NoSuchOption(option_name)
 
 
@@ -249,8 +273,7 @@ class Joke(ABC):
             if converter.type_convertor != OptionType.HIDDEN:
                 new_value = converter.type_convertor(new_value)
             # Set the value
-            await getattr(bot._conf.guild(guild), option_name)\
-                .set(new_value)
+            await bot.guild_settings.set(guild, option_name, new_value)
         except (AttributeError, KeyError):
             raise NoSuchOption(option_name)
 
@@ -0,0 +1,363 @@
+"""Matchers that find jokes in the text of a message.
+These replace regular expressions that backtracked heavily on long messages,
+each scanning a message once in linear time. They don't depend on discord, so
+they can be benchmarked on their own with "python jokes/matchers.py".
+"""
+import re
+import time
+from typing import Callable, FrozenSet, Iterable, Optional, Tuple
+
+
+# A run of word characters, the same as \w+ in the replaced expressions
+_WORD_RE = re.compile(r"\w+")
+# The end of an "er" or "ers" word with a stem, backwards. Either the word
+# goes on past the "er", though not as just "her", or it is just "er" and
+# follows another word. "ſ" is an "s" ignoring case.
+_REVERSED_ER_RE = re.compile(
+        r"\b(?P<ending>[sSſ]?[rR][eE])(?=(?![hH]\b)\w|\W\w)")
+
+
+def her_stem(text:str) -> Optional[str]:
+    """Return the stem of the last "er" or "ers" word of the first line of the
+    text, the stem being everything before the "er".
+    This gives the same result as matching
+    ".*(?P<her>\\b((\\w*[^h])|(\\w+h))er[s]?\\b).*" ignoring case, and taking
+    the second group, but without backtracking. The first line is searched
+    backwards for word endings, so only the words that end in "er" are looked
+    at, and the search stops at the first that has a stem.
+    Words that are just "her" or "hers" are skipped, and like the expression
+    a word that is just "er" or "ers" following another word has the
+    character between the two as its stem.
+
+    Parameters
+    ----------
+    text: str
+        The text to search.
+
+    Returns
+    -------
+    Optional[str]
+        The stem, or None if there is no "er" word.
+    """
+    # The expression's leading ".*" never crosses a newline, so the stem must
+    # start on the first line, though a stem of just "\n" ends on the second
+    line_end = text.find("\n")
+    if line_end == -1:
+        line_end = len(text)
+        length = line_end
+    else:
+        word = _WORD_RE.match(text, line_end + 1)
+        length = word.end() if word else line_end + 1
+    backwards = text[length - 1::-1] if length else ""
+
+    for ending in _REVERSED_ER_RE.finditer(backwards):
+        # Find the start of the word, and the "er" of its ending
+        er = length - ending.end("ending")
+        word = _WORD_RE.match(backwards, ending.end("ending"))
+        if word is None:
+            # The stem is the single character between this and the last word
+            return text[er - 1]
+        start = length - word.end()
+        # Only a word on the second line can fail, being past the first
+        if start <= line_end:
+            return text[start:er]
+    return None
+
+
+# The characters that are taken to be an "I" or an "m" in "I'm".
+# Users and the original author of Dad got in an arms race of using visually
+# similar versions of "I'm" and detecting said versions. Add to these to
+# detect more. The last few are only here as the old expression matched them
+# ignoring case.
+I_VARIANTS = r"ℹ️ⁱîỉᶧĨꟷḭꞮᶤÌ𐌉İᵢIⲓǏł1ꞼȉlịḯꞽĪıᵻ ǐіɨ́̃ĬȋḮĩįɪÎᶦ𐤉ìỈІ𐌹¡ꟾÍᴉ|ïí̀Ȋᵎ"\
+        r"Ⲓ ιȈᴵΙḬỊiᛁÏĭīΐϊίΓाjƗͅ"\
+        "\u1fbe\u1fd3"
+M_VARIANTS = r"ꟽℳ₥𐌼Ɯ𐤌mΜṃɯᶭṁⲘṂⱮⲙḾᵯₘMɱꟺḿꬺ™Мᵚᴹмɰᵐᴟᶆᴍ𐌌ᛗμᶬṀꟿ̃℠ल♏️µ"
+# The ASCII stand in for a character in the folded text, by rather it is an
+# "I", rather it is an "m", and rather it is a word character, whitespace, or
+# neither. Keeping the kind keeps the meaning of \b, \W, and \s.
+_STAND_INS = {
+    (True, False, "word"): "i",
+    (False, True, "word"): "m",
+    (True, True, "word"): "_",
+    (True, False, "space"): " ",
+    (False, True, "space"): "\t",
+    (True, True, "space"): "\v",
+    (True, False, "other"): "|",
+    (False, True, "other"): "~",
+    (True, True, "other"): "^",
+    (False, False, "word"): "x",
+    (False, False, "space"): "\f",
+    (False, False, "other"): "#",
+}
+# The most characters the fold table learns, see _FoldTable
+_FOLD_TABLE_SIZE = 65536
+
+
+def _case_variants(chars:str) -> FrozenSet[str]:
+    """Return the characters along with their upper and lower cases."""
+    variants = set(chars)
+    for _ in range(2):
+        variants.update(case for char in list(variants)
+                for case in (char.lower(), char.upper()) if len(case) == 1)
+    return frozenset(variants)
+
+
+def _kind(char:str) -> str:
+    """Return rather the character is a "word" character, "space", or
+    "other"."""
+    if _WORD_RE.match(char):
+        return "word"
+    elif char.isspace():
+        return "space"
+    else:
+        return "other"
+
+
+class _FoldTable(dict):
+    """A str.translate table that folds every character to its ASCII stand
+    in. The variants of "I" and "m" are filled in up front, every other
+    character is folded to the neutral stand in of its kind, and learned the
+    first time it is seen.
+    """
+    def __missing__(self, codepoint:int) -> str:
+        stand_in = _STAND_INS[(False, False, _kind(chr(codepoint)))]
+        # Don't let a flood of odd characters grow the table forever
+        if len(self) < _FOLD_TABLE_SIZE:
+            self[codepoint] = stand_in
+        return stand_in
+
+
+def _fold_table() -> _FoldTable:
+    """Return the table that folds every "I" and "m" to its ASCII stand in,
+    ignoring case, and every other character to a neutral stand in.
+    Every character is folded to exactly one character, so the indices of the
+    folded text are those of the original.
+    """
+    i_chars = _case_variants(I_VARIANTS)
+    m_chars = _case_variants(M_VARIANTS)
+    table = _FoldTable()
+    for char in i_chars | m_chars | set(map(chr, range(128))):
+        table[ord(char)] = _STAND_INS[
+                (char in i_chars, char in m_chars, _kind(char))]
+    # The vowels between the "I" and "m"
+    table.update({ord(vowel): vowel.lower() for vowel in "aAeE"})
+    return table
+
+
+_FOLD_TABLE = _fold_table()
+# The stand ins of every "I" and "m"
+_I_STAND_INS = "".join(stand_in for (is_i, _, _), stand_in
+        in _STAND_INS.items() if is_i)
+_M_STAND_INS = "".join(stand_in for (_, is_m, _), stand_in
+        in _STAND_INS.items() if is_m)
+# Matches "I'm" in the folded text, which is all ASCII
+_FOLDED_IAM_RE = re.compile(f"\\b[{re.escape(_I_STAND_INS)}]\\W*[ae]*"\
+        f"[{re.escape(_M_STAND_INS)}]\\b", re.ASCII)
+# The name after an "I'm", taken from the original text
+_NAME_RE = re.compile(r"\s*(.*)")
+# The ASCII characters that fold to a neutral word character. No "I'm" can
+# span one, so the text can be folded in pieces cut after them.
+_CUT_RE = re.compile("[{}]".format("".join(
+        char for char in map(chr, range(128))
+        if _FOLD_TABLE[ord(char)] == _STAND_INS[(False, False, "word")])))
+# About how much of the text is folded at a time
+_FOLD_PIECE = 256
+
+
+def find_i_am(text:str) -> Optional[Tuple[str, str]]:
+    """Return the first "I'm" of the text, in any of its variants, and the
+    name after it.
+    This gives the same result as searching
+    "(?P<iam>\\b[I]\\W*[ae]*[M]\\b)\\s*(?P<name>.*)" ignoring case, where I and
+    M are the classes of I_VARIANTS and M_VARIANTS. Rather than check every
+    character against those classes, the text is folded to ASCII, and searched
+    with a tiny ASCII expression. The folded text has the same indices, so the
+    "I'm" and name are taken from the original text.
+    The text is folded a piece at a time, so an early "I'm" in a long message
+    only costs the folding of the first piece.
+
+    Parameters
+    ----------
+    text: str
+        The text to search.
+
+    Returns
+    -------
+    Optional[Tuple[str, str]]
+        The "I'm" and the rest of its line after any whitespace, or None if
+        there is no "I'm".
+    """
+    start = 0
+    while True:
+        cut = _CUT_RE.search(text, start + _FOLD_PIECE)
+        end = cut.end() if cut else len(text)
+        # Include the character before the piece, as \b looks at it
+        before = max(start - 1, 0)
+        match = _FOLDED_IAM_RE.search(
+                text[before:end].translate(_FOLD_TABLE), start - before)
+        if match is not None:
+            iam_end = before + match.end()
+            return text[before + match.start():iam_end],\
+                    _NAME_RE.match(text, iam_end).group(1)
+        if cut is None:
+            return None
+        start = end
+
+
+class RankMatcher:
+    def __init__(self, ranks:Iterable[str]):
+        """Init for the RankMatcher object.
+        The purpose of this object is to find a rank followed by a title, as
+        in "Major Explanation". A rank can also be said with "ly" on the end,
+        as in "Generally Speaking".
+        The words are exposed, so that Dad can skip messages without a rank
+        word with a single split and set lookup before asking for a match.
+        The match doesn't look for them again, so a message is only split
+        once more, to walk its words in order.
+
+        Parameters
+        ----------
+        ranks: Iterable[str]
+            The ranks to find.
+        """
+        # Each way to say a rank, to the rank
+        self._ranks = {}
+        for rank in ranks:
+            rank = rank.lower()
+            self._ranks[rank] = rank
+            self._ranks[f"{rank}ly"] = rank
+        self.words = frozenset(self._ranks)
+
+
+    def find(self, text:str) -> Optional[Tuple[str, str]]:
+        """Return the rank and title in the text.
+        The title is the word that follows the rank after only whitespace.
+        Like the expression this replaced, the first line with a rank that has
+        a title is used, and the last such rank on that line.
+
+        Parameters
+        ----------
+        text: str
+            The text to search.
+
+        Returns
+        -------
+        Optional[Tuple[str, str]]
+            The rank, in lower case and without "ly", and the title, or None
+            if there is no rank with a title.
+        """
+        found = None
+        line_end = len(text)
+        previous = None
+        for word in _WORD_RE.finditer(text):
+            rank = previous and self._ranks.get(previous.group().lower())
+            if rank is not None and\
+                    text[previous.end():word.start()].isspace():
+                if found is None:
+                    # Only the rest of this line can have a later rank
+                    line_end = text.find("\n", previous.end())
+                    if line_end == -1:
+                        line_end = len(text)
+                elif previous.start() > line_end:
+                    break
+                found = rank, word.group()
+            previous = word
+        return found
+
+
+def _time(find:Callable[[str], object], text:str, repeat:int=20) -> float:
+    """Return the average seconds the find function takes on the text,
+    repeating it less if it is slow."""
+    began = time.perf_counter()
+    for runs in range(1, repeat + 1):
+        find(text)
+        if time.perf_counter() - began > 0.1:
+            break
+    return (time.perf_counter() - began) / runs
+
+
+def _compare(title:str, old:Callable[[str], object],
+        new:Callable[[str], object], texts:Iterable[str]) -> None:
+    """Print how long the old and new ways of finding a joke take on each
+    text, after checking that they agree.
+
+    Parameters
+    ----------
+    title: str
+        What is being compared.
+    old: Callable[[str], object]
+        The replaced way of finding the joke.
+    new: Callable[[str], object]
+        The matcher that replaced it, returning the same as old.
+    texts: Iterable[str]
+        The texts to time them on.
+    """
+    print(title)
+    print(f"{'chars':>8} {'old us':>12} {'new us':>12}")
+    for text in texts:
+        assert old(text) == new(text), text[:40]
+        print(f"{len(text):>8} {_time(old, text) * 1e6:>12.1f} "\
+              f"{_time(new, text) * 1e6:>12.1f}")
+
+
+def main():
+    """Benchmark the matchers against the expressions they replaced, on
+    messages built to be their worst case, at sizes up to a Nitro message and
+    beyond. The time the matchers take should grow with the size, no faster.
+    """
+    sizes = (500, 1000, 2000, 4000, 8000)
+
+    her_re = re.compile(r".*(?P<her>\b((\w*[^h])|(\w+h))er[s]?\b).*",
+            re.IGNORECASE)
+    old_her = lambda text: (lambda m: m and m.group(2))(her_re.match(text))
+    _compare("Her: words without an \"er\" ending", old_her, her_stem,
+            [("a" * 9 + " ") * (size // 10) for size in sizes])
+    _compare("Her: one long word almost ending in \"er\"", old_her, her_stem,
+            ["er" * (size // 2) + "e" for size in sizes])
+    _compare("Her: an \"er\" word at the start", old_her, her_stem,
+            ["Dader " + "ha " * (size // 3) for size in sizes])
+    _compare("Her: nothing but \"her\"", old_her, her_stem,
+            ["her " * (size // 4) for size in sizes])
+    _compare("Her: a boundary at every other character", old_her, her_stem,
+            ["a-" * (size // 2) for size in sizes])
+
+    iam_re = re.compile(f"(?P<iam>\\b[{I_VARIANTS}]\\W*[ae]*[{M_VARIANTS}]\\b)"\
+            "\\s*(?P<name>.*)", re.IGNORECASE)
+    old_iam = lambda text: (lambda m: m and m.group("iam", "name"))(
+            iam_re.search(text))
+    chatter = "Dad, I'm hungry. Has anyone seen the remote? lol 😂 " \
+            "we're playing later, ımma be late, ok? "
+    _compare("I'm: real messages", old_iam, find_i_am,
+            ["I'm hungry", "Dad, I am so tired of this",
+                "I’m not a bot, l'm a real person", "ℹ️M Dad", "ıᴍ here",
+                chatter, (chatter * 100)[:4000]])
+    _compare("I'm: no \"I'm\" in sight", old_iam, find_i_am,
+            [("the quick brown fox jumps over the lazy dog " * 200)[:size]
+                for size in sizes])
+    _compare("I'm: nothing but \"I\"", old_iam, find_i_am,
+            ["I" * size for size in sizes])
+    _compare("I'm: \"I\" and vowels without \"m\"", old_iam, find_i_am,
+            ["I" + "a" * size for size in sizes])
+    _compare("I'm: \"I\" and spaces without \"m\"", old_iam, find_i_am,
+            ["I" + " !" * (size // 2) for size in sizes])
+
+    ranks = ("admiral", "brigadier", "cadet", "captain", "colonel",
+            "commander", "general", "marshal", "major", "officer",
+            "lieutenant", "private", "sergeant")
+    rank_re = re.compile(r".*(?P<rank>\b(" + "|".join(ranks) + r"\b))(ly)?"\
+            r"\s+(?P<title>\b\w+\b)", re.IGNORECASE)
+    old_rank = lambda text: (lambda m: m and (m.group("rank").lower(),
+            m.group("title")))(rank_re.search(text))
+    rank_matcher = RankMatcher(ranks)
+    _compare("Rank: real messages", old_rank, rank_matcher.find,
+            ["Major explanation", "that was a major pain, general",
+                "ok private", (chatter * 100)[:4000]])
+    _compare("Rank: many lines without a rank", old_rank, rank_matcher.find,
+            ["all quiet on the front\n" * (size // 23) for size in sizes])
+    _compare("Rank: ranks without titles", old_rank, rank_matcher.find,
+            ["major, " * (size // 7) for size in sizes[:-1]])
+
+
+if __name__ == "__main__":
+    main()
@@ -5,7 +5,7 @@ from redbot.core.bot import Red
 
 from .joke import Joke
 from .favoritism import FavoritismJoke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class NaughtyJoke(Joke):
@@ -18,6 +18,8 @@ class NaughtyJoke(Joke):
         
         # Set up super class
         super().__init__("naughty", 5.0)
+        # Set up this class
+        self.triggers = [FavoritismJoke.rude_phrases_re.pattern]
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -46,9 +48,9 @@ class NaughtyJoke(Joke):
             response = {"title":"Children shouldn't swear"}
             # Construct embed
             embed = discord.Embed.from_dict(response)
-            embed.set_image(url=random_image_url_in_category("naughty"))
+            image = await set_embed_image(embed, "naughty", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
@@ -42,6 +42,7 @@ class OkBoomerJoke(Joke):
                 "🇪",
                 "🇷"
             ]
+        self.triggers = [self.boomer_re.pattern, self.zoomer_re.pattern]
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -1,12 +1,12 @@
 from abc import ABC, abstractmethod
 import discord
 import logging
-import re
 from redbot.core import checks, commands, Config
 from redbot.core.bot import Red
 
 from .joke import Joke
-from ..images import random_image_url_in_category
+from .matchers import RankMatcher
+from .util import set_embed_image
 
 
 class RankJoke(Joke):
@@ -17,7 +17,8 @@ class RankJoke(Joke):
         armed forces, and Y is any word. Example: "Major Explanation".
         The joke is to send a gif of a person saluting with the title 
         "Major Explanation" or whatever was actually said. This stems from a
-        bit in "How I Met Your Mother".
+        bit in "How I Met Your Mother". The rank can also be said with "ly"
+        on the end, as in "Generally Speaking".
         """
         # Set up super class
         super().__init__("rank", 100.0)
@@ -37,11 +38,8 @@ class RankJoke(Joke):
             "private",
             "sergeant"
         ]
-        ranks_re = "|".join(ranks)
-        self.rank_re = re.compile(
-                r".*(?P<rank>\b(" + ranks_re + r"\b))(ly)?" +\
-                        r"\s+(?P<title>\b\w+\b)", 
-                re.IGNORECASE)
+        self.rank_matcher = RankMatcher(ranks)
+        self.trigger_words = self.rank_matcher.words
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -59,21 +57,21 @@ class RankJoke(Joke):
         bool
             Success of joke.
         """
-        match = self.rank_re.search(msg.content)
+        match = self.rank_matcher.find(msg.content)
         if match is None:
             # No joke was possible, stop
             return False
         else:
+            rank, title = match
             # Log joke
-            self.log_info(msg.guild, msg.author, match)
+            self.log_info(msg.guild, msg.author, f"{rank} {title}")
             # Construct our response
-            response = {"title": f"{match.group('rank').capitalize()} "\
-                                 f"{match.group('title').capitalize()}"}
+            response = {"title": f"{rank.capitalize()} {title.capitalize()}"}
             # Construct embed
             embed = discord.Embed.from_dict(response)
-            embed.set_image(url=random_image_url_in_category("salute"))
+            image = await set_embed_image(embed, "salute", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
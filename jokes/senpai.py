@@ -4,7 +4,7 @@ import re
 from redbot.core.bot import Red
 
 from .joke import Joke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class SenpaiJoke(Joke):
@@ -23,6 +23,7 @@ class SenpaiJoke(Joke):
         ]
         self.senpai_re = re.compile("|".join(senpai_phrases),
                 re.IGNORECASE)
+        self.triggers = senpai_phrases
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -49,9 +50,9 @@ class SenpaiJoke(Joke):
             self.log_info(msg.guild, msg.author, match)
             # Construct embed
             embed = discord.Embed.from_dict({})
-            embed.set_image(url=random_image_url_in_category("senpai"))
+            image = await set_embed_image(embed, "senpai", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
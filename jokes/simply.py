@@ -4,7 +4,7 @@ import re
 from redbot.core.bot import Red
 
 from .joke import Joke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class SimplyJoke(Joke):
@@ -26,6 +26,7 @@ class SimplyJoke(Joke):
         ]
         simply_phrase_re = "|".join(simply_phrase)
         self.simply_re = re.compile(simply_phrase_re, re.IGNORECASE)
+        self.triggers = [simply_phrase_re]
 
 
 
@@ -53,9 +54,9 @@ class SimplyJoke(Joke):
             self.log_info(msg.guild, msg.author, match)
             # Construct embed
             embed = discord.Embed.from_dict({})
-            embed.set_image(url=random_image_url_in_category("simply"))
+            image = await set_embed_image(embed, "simply", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
@@ -4,7 +4,7 @@ import re
 from redbot.core.bot import Red
 
 from .joke import Joke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class SmashingJoke(Joke):
@@ -22,6 +22,7 @@ class SmashingJoke(Joke):
         super().__init__("smashing", 100.0)
         # Set up this class
         self.smashing_re = re.compile(r"smash", re.IGNORECASE)
+        self.triggers = [self.smashing_re.pattern]
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -48,9 +49,9 @@ class SmashingJoke(Joke):
             self.log_info(msg.guild, msg.author, match)
             # Construct embed
             embed = discord.Embed.from_dict({})
-            embed.set_image(url=random_image_url_in_category("smashing"))
+            image = await set_embed_image(embed, "smashing", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
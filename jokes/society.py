@@ -4,7 +4,7 @@ import re
 from redbot.core.bot import Red
 
 from .joke import Joke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class SocietyJoke(Joke):
@@ -26,6 +26,7 @@ class SocietyJoke(Joke):
             "v(-)?bucks"
         ]
         self.society_re = re.compile("|".join(society_phrases), re.IGNORECASE)
+        self.triggers = society_phrases
 
 
     async def _make_verbal_joke(self, bot: Red, msg: discord.Message) -> bool:
@@ -62,9 +63,9 @@ class SocietyJoke(Joke):
 
             # Construct embed
             embed = discord.Embed.from_dict({})
-            embed.set_image(url=random_image_url_in_category("society"))
+            image = await set_embed_image(embed, "society", msg.guild.id)
             # Send embed
-            await msg.channel.send(embed=embed)
+            await msg.channel.send(embed=embed, file=image)
             # Return success
             return True
 
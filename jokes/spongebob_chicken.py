@@ -4,7 +4,7 @@ import re
 from redbot.core.bot import Red
 
 from .joke import Joke
-from ..images import random_image_url_in_category
+from .util import set_embed_image
 
 
 class SpongebobChickenJoke(Joke):
@@ -43,9 +43,9 @@ class SpongebobChickenJoke(Joke):
         response = {"description":self.chicken_case(msg.content)}
         # CoNsTrUcT eMbEd
         embed = discord.Embed.from_dict(response)
-        embed.set_image(url=random_image_url_in_category("SpOnGeBoB"))
+        image = await set_embed_image(embed, "SpOnGeBoB", msg.guild.id)
         # SeNd EmBeD
-        await msg.channel.send(embed=embed)
+        await msg.channel.send(embed=embed, file=image)
         # ReTuRn SuCcSeSs
         return True
 
@@ -0,0 +1,97 @@
+import re
+from typing import Callable, FrozenSet, Iterable, List
+
+
+# The words of a message, as trigger words are matched against
+_WORD_RE = re.compile(r"\w+")
+
+
+class TriggerIndex:
+    def __init__(self):
+        """Init for the TriggerIndex object.
+        The purpose of this object is to let Dad decide cheaply which jokes
+        could possibly be made upon a message.
+        Each joke declares the regular expressions that must appear in a
+        message for the joke to apply. These are compiled once per joke, and
+        searched for one joke after another. This was measured to be faster
+        than a single combined expression of lookaheads, which has to try
+        every joke's triggers at every position of the message.
+        Jokes can instead declare trigger words, one of which must be a word
+        of the message. The words of a message are found with one split, and
+        each joke's words are checked against them with a set lookup.
+        Jokes can also declare a trigger matcher, a function which is called
+        with the message to decide, for text no regular expression finds
+        cheaply.
+        Jokes that declare no triggers apply to every message and are always
+        returned as candidates.
+        """
+        self._always = []
+        self._triggered = []
+        self._trigger_res = []
+        self._worded = []
+        self._trigger_words = []
+        self._matched = []
+        self._trigger_matchers = []
+
+
+    def add(self, joke:"Joke", triggers:Iterable[str]=None,
+            words:FrozenSet[str]=None,
+            matcher:Callable[[str], bool]=None) -> None:
+        """Register the triggers of a joke.
+
+        Parameters
+        ----------
+        joke: Joke
+            The joke to register.
+        triggers: Iterable[str]=None
+            Regular expressions, any of which must match the message for the
+            joke to apply.
+        words: FrozenSet[str]=None
+            Lower case words, any of which must be a word of the message for
+            the joke to apply.
+        matcher: Callable[[str], bool]=None
+            A function given the message, which returns True if the joke
+            could apply. If this, triggers, and words are all None then the
+            joke applies to every message.
+        """
+        if triggers is None and words is None and matcher is None:
+            self._always.append(joke)
+        if triggers is not None:
+            self._triggered.append(joke)
+            self._trigger_res.append(re.compile(
+                "|".join(f"(?:{trig})" for trig in triggers), re.IGNORECASE))
+        if words is not None:
+            self._worded.append(joke)
+            self._trigger_words.append(frozenset(words))
+        if matcher is not None:
+            self._matched.append(joke)
+            self._trigger_matchers.append(matcher)
+
+
+    def candidates(self, content:str) -> List["Joke"]:
+        """Return the jokes that could possibly be made upon the content.
+
+        Parameters
+        ----------
+        content: str
+            The message contents to scan.
+
+        Returns
+        -------
+        List[Joke]
+            The jokes without triggers, followed by every joke with a trigger,
+            trigger word, or trigger matcher found in the content.
+        """
+        candidates = self._always + [joke for joke, trig_re
+                in zip(self._triggered, self._trigger_res)
+                if trig_re.search(content)]
+        if self._worded:
+            words = frozenset(_WORD_RE.findall(content.lower()))
+            for joke, trigger_words in zip(self._worded, self._trigger_words):
+                if joke not in candidates and\
+                        not trigger_words.isdisjoint(words):
+                    candidates.append(joke)
+        for joke, matcher in zip(self._matched, self._trigger_matchers):
+            if joke not in candidates and matcher(content):
+                candidates.append(joke)
+        return candidates
@@ -1,8 +1,13 @@
 from enum import Enum
 import discord
+import io
 import os
 import random
 random.seed()
+from typing import Optional
+
+from ..images import backup_image_bytes, image_file_extension, \
+        is_url_healthy, random_image_url_in_category
 
 
 def convert_to_boolean(boolean: str) -> bool:
@@ -120,3 +125,35 @@ class Option:
         # its value, instead of staying an Enum.
         self.type_convertor = option_type
 
+
+async def set_embed_image(embed:discord.Embed, category:str,
+        guild_id:int, **constraints) -> Optional[discord.File]:
+    """Set the image of an embed to a random image in the category.
+    If the picked url is known to be bad and the image is backed up, then the
+    backup is attached instead, and must be sent along with the embed.
+
+    Parameters
+    ----------
+    embed: discord.Embed
+        The embed to set the image of.
+    category: str
+        The category to find an image in.
+    guild_id: int
+        The id of the guild the image is for.
+    **constraints
+        Limits on the image, see random_image_url_in_category.
+
+    Returns
+    -------
+    Optional[discord.File]
+        The attachment to send with the embed, or None if the url is used.
+    """
+    url = random_image_url_in_category(category, guild_id, **constraints)
+    if not is_url_healthy(url):
+        data = await backup_image_bytes(url)
+        if data is not None:
+            file_name = f"{category}.{image_file_extension(data)}"
+            embed.set_image(url=f"attachment://{file_name}")
+            return discord.File(io.BytesIO(data), filename=file_name)
+    embed.set_image(url=url)
+    return None
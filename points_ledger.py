@@ -0,0 +1,161 @@
+import asyncio
+from collections import defaultdict
+import discord
+from redbot.core import Config
+from typing import Dict
+
+
+class PointsLedger:
+    def __init__(self, conf:Config, default_member_settings:dict):
+        """Init for the PointsLedger object.
+        The purpose of this object is to stop every change to a member's
+        points from costing a read and a write to storage.
+        Changes are accumulated in memory per guild and member, and are
+        written to the Config in one batch per guild whenever flush is called.
+        Reading a member's points includes their changes that have yet to be
+        written.
+
+        Parameters
+        ----------
+        conf: Config
+            The Config object the member points are stored in.
+        default_member_settings: dict
+            The default values of every member setting.
+        """
+        self._conf = conf
+        self._defaults = default_member_settings
+        # guild id -> member id -> points yet to be written
+        self._pending = defaultdict(lambda: defaultdict(int))
+        # Held while writing so readers never count a change twice
+        self._lock = asyncio.Lock()
+
+
+    def add(self, member:discord.Member, points:int) -> None:
+        """Record a change to a member's points.
+
+        Parameters
+        ----------
+        member: discord.Member
+            Member to add points to.
+        points: int
+            Points to add. Note the points "added" can be negative.
+        """
+        self._pending[member.guild.id][member.id] += points
+
+
+    def pending(self, guild_id:int, member_id:int) -> int:
+        """Return the points of a member that have yet to be written.
+
+        Parameters
+        ----------
+        guild_id: int
+            The id of the guild the member is in.
+        member_id: int
+            The id of the member.
+
+        Returns
+        -------
+        int
+            The sum of the unwritten changes to the member's points.
+        """
+        guild_pending = self._pending.get(guild_id)
+        if guild_pending is None:
+            return 0
+        return guild_pending.get(member_id, 0)
+
+
+    async def get(self, member:discord.Member) -> int:
+        """Return the points of a member, including unwritten changes.
+
+        Parameters
+        ----------
+        member: discord.Member
+            Member to get the points of.
+
+        Returns
+        -------
+        int
+            The member's points.
+        """
+        async with self._lock:
+            return await self._conf.member(member).points() +\
+                    self.pending(member.guild.id, member.id)
+
+
+    async def guild_member_data(self, guild:discord.Guild) -> Dict[int, dict]:
+        """Return the saved data of every member of a guild in one read, with
+        unwritten changes included in their points.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to get the member data of.
+
+        Returns
+        -------
+        Dict[int, dict]
+            The data of each member with saved data or unwritten changes,
+            keyed by member id. Members without either are left out, and have
+            the default values.
+        """
+        async with self._lock:
+            member_data = await self._conf.all_members(guild)
+            for member_id, pending in self._pending.get(guild.id, {}).items():
+                if member_id not in member_data:
+                    member_data[member_id] = dict(self._defaults)
+                member_data[member_id]["points"] += pending
+            return member_data
+
+
+    async def set(self, member:discord.Member, points:int) -> None:
+        """Immediately set the points of a member, discarding any unwritten
+        changes.
+
+        Parameters
+        ----------
+        member: discord.Member
+            Member to set the points of.
+        points: int
+            The new points of the member.
+        """
+        async with self._lock:
+            self._pending[member.guild.id].pop(member.id, None)
+            await self._conf.member(member).points.set(points)
+
+
+    async def reset_guild(self, guild:discord.Guild) -> None:
+        """Immediately set the points of every member of a guild to 0,
+        discarding any unwritten changes.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to reset the points of.
+        """
+        async with self._lock:
+            self._pending.pop(guild.id, None)
+            group = self._conf._get_base_group(Config.MEMBER, str(guild.id))
+            async with group.all() as members:
+                for member_data in members.values():
+                    member_data["points"] = 0
+
+
+    async def flush(self) -> None:
+        """Write all unwritten changes, with one write per guild."""
+        async with self._lock:
+            for guild_id in list(self._pending):
+                guild_pending = self._pending.pop(guild_id)
+                group = self._conf._get_base_group(Config.MEMBER,
+                        str(guild_id))
+                try:
+                    async with group.all() as members:
+                        for member_id, points in guild_pending.items():
+                            member_data = members.setdefault(
+                                    str(member_id), {})
+                            member_data["points"] =\
+                                    member_data.get("points", 0) + points
+                except Exception:
+                    # Keep the changes around for the next flush
+                    for member_id, points in guild_pending.items():
+                        self._pending[guild_id][member_id] += points
+                    raise
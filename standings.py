@@ -0,0 +1,410 @@
+import discord
+from random import random
+from typing import Any, Dict, Iterator, List, Tuple
+
+from .points_ledger import PointsLedger
+
+
+class _Greatest:
+    """Compares greater than everything else, so it can end the skip list"""
+    def __lt__(self, other) -> bool:
+        return False
+
+
+    def __le__(self, other) -> bool:
+        return False
+
+
+    def __gt__(self, other) -> bool:
+        return True
+
+
+    def __ge__(self, other) -> bool:
+        return True
+
+
+
+class _Node:
+    __slots__ = ("value", "next", "width")
+
+
+    def __init__(self, value:Any, levels:int):
+        """Init for the _Node object.
+        A node of the skip list, linked to the next node on each of its
+        levels, along with how many nodes along the bottom level that is.
+
+        Parameters
+        ----------
+        value: Any
+            The value of the node.
+        levels: int
+            The number of levels the node is linked on.
+        """
+        self.value = value
+        self.next = [None] * levels
+        self.width = [1] * levels
+
+
+
+class _SkipList:
+    # Enough levels for about a million values before searches slow down
+    _MAX_LEVELS = 20
+
+
+    def __init__(self):
+        """Init for the _SkipList object.
+        The purpose of this object is to keep values sorted while inserting,
+        removing, and finding the position of any one of them in O(log n)
+        time, rather than moving every value after it like a list would.
+        Each node keeps how far it skips on each level, so the node at any
+        position can be reached without walking the bottom level.
+        """
+        self._tail = _Node(_Greatest(), self._MAX_LEVELS)
+        self.clear()
+
+
+    def __len__(self) -> int:
+        """Return the number of values"""
+        return self._size
+
+
+    def clear(self) -> None:
+        """Remove every value"""
+        self._head = _Node(None, self._MAX_LEVELS)
+        self._head.next = [self._tail] * self._MAX_LEVELS
+        self._size = 0
+
+
+    def _node_at(self, index:int) -> _Node:
+        """Return the node at a position, starting from 0"""
+        node = self._head
+        # The head itself is position -1
+        remaining = index + 1
+        for level in reversed(range(self._MAX_LEVELS)):
+            while node.width[level] <= remaining:
+                remaining -= node.width[level]
+                node = node.next[level]
+        return node
+
+
+    def __getitem__(self, index:int) -> Any:
+        """Return the value at a position, starting from 0"""
+        if index < 0:
+            index += self._size
+        if not 0 <= index < self._size:
+            raise IndexError("skip list index out of range")
+        return self._node_at(index).value
+
+
+    def index(self, value:Any) -> int:
+        """Return the position of the first value not less than the value,
+        starting from 0."""
+        node = self._head
+        position = 0
+        for level in reversed(range(self._MAX_LEVELS)):
+            while node.next[level].value < value:
+                position += node.width[level]
+                node = node.next[level]
+        return position
+
+
+    def insert(self, value:Any) -> None:
+        """Add a value in its sorted position"""
+        chain = [None] * self._MAX_LEVELS
+        steps_at_level = [0] * self._MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self._MAX_LEVELS)):
+            while node.next[level].value <= value:
+                steps_at_level[level] += node.width[level]
+                node = node.next[level]
+            chain[level] = node
+        # Each level up holds half as many nodes as the one below it
+        levels = 1
+        while levels < self._MAX_LEVELS and random() < 0.5:
+            levels += 1
+        new_node = _Node(value, levels)
+        steps = 0
+        for level in range(levels):
+            prev_node = chain[level]
+            new_node.next[level] = prev_node.next[level]
+            prev_node.next[level] = new_node
+            new_node.width[level] = prev_node.width[level] - steps
+            prev_node.width[level] = steps + 1
+            steps += steps_at_level[level]
+        # The levels above the new node now skip over one more node
+        for level in range(levels, self._MAX_LEVELS):
+            chain[level].width[level] += 1
+        self._size += 1
+
+
+    def remove(self, value:Any) -> None:
+        """Remove a value, raising a ValueError if it isn't there"""
+        chain = [None] * self._MAX_LEVELS
+        node = self._head
+        for level in reversed(range(self._MAX_LEVELS)):
+            while node.next[level].value < value:
+                node = node.next[level]
+            chain[level] = node
+        node = chain[0].next[0]
+        if node is self._tail or node.value != value:
+            raise ValueError(f"{value} not in skip list")
+        for level in range(len(node.next)):
+            prev_node = chain[level]
+            prev_node.width[level] += node.width[level] - 1
+            prev_node.next[level] = node.next[level]
+        # The levels above the node now skip over one less node
+        for level in range(len(node.next), self._MAX_LEVELS):
+            chain[level].width[level] -= 1
+        self._size -= 1
+
+
+    def slice(self, start:int, stop:int) -> Iterator[Any]:
+        """Iterate over the values from one position up to another"""
+        stop = min(stop, self._size)
+        if start >= stop:
+            return
+        node = self._node_at(start)
+        for _ in range(stop - start):
+            yield node.value
+            node = node.next[0]
+
+
+
+class Leaderboard:
+    def __init__(self, values:Dict[int, int]=None):
+        """Init for the Leaderboard object.
+        The purpose of this object is to keep the members of a guild sorted
+        by a value, such as their points, so that rankings don't have to be
+        rebuilt and re-sorted every time someone asks for them.
+        Members are kept in a skip list sorted by (-value, member id), so
+        moving a member or finding their rank is O(log n) rather than
+        shifting the whole list. Only members with non-zero values are kept,
+        everyone else is tied for last.
+
+        Parameters
+        ----------
+        values: Dict[int, int]=None
+            The starting value of each member, keyed by member id.
+        """
+        self._values = dict()
+        self._order = _SkipList()
+        if values:
+            for member_id, value in values.items():
+                self.update(member_id, value)
+
+
+    def __len__(self) -> int:
+        """Return the number of members with a non-zero value"""
+        return len(self._order)
+
+
+    def value(self, member_id:int) -> int:
+        """Return the value of a member.
+
+        Parameters
+        ----------
+        member_id: int
+            The id of the member.
+
+        Returns
+        -------
+        int
+            The value of the member.
+        """
+        return self._values.get(member_id, 0)
+
+
+    def update(self, member_id:int, value:int) -> None:
+        """Set the value of a member, moving them to their new position.
+
+        Parameters
+        ----------
+        member_id: int
+            The id of the member.
+        value: int
+            The new value of the member.
+        """
+        old_value = self._values.pop(member_id, None)
+        if old_value is not None:
+            self._order.remove((-old_value, member_id))
+        if value != 0:
+            self._values[member_id] = value
+            self._order.insert((-value, member_id))
+
+
+    def remove(self, member_id:int) -> None:
+        """Remove a member, such as when they leave the guild.
+
+        Parameters
+        ----------
+        member_id: int
+            The id of the member.
+        """
+        self.update(member_id, 0)
+
+
+    def clear(self) -> None:
+        """Remove every member, such as when all values are reset."""
+        self._values = dict()
+        self._order.clear()
+
+
+    def rank(self, member_id:int) -> int:
+        """Return the position of a member, starting from 1.
+
+        Parameters
+        ----------
+        member_id: int
+            The id of the member.
+
+        Returns
+        -------
+        int
+            The position of the member, or None if their value is 0.
+        """
+        value = self._values.get(member_id)
+        if value is None:
+            return None
+        return self._order.index((-value, member_id)) + 1
+
+
+    def page(self, page_number:int, page_size:int) -> List[Tuple[int, int]]:
+        """Return a page of the leaderboard.
+
+        Parameters
+        ----------
+        page_number: int
+            The page to return, starting from 1.
+        page_size: int
+            The number of members on each page.
+
+        Returns
+        -------
+        List[Tuple[int, int]]
+            The member id and value of each member on the page, in order.
+        """
+        start = (page_number - 1) * page_size
+        return [(member_id, -neg_value) for neg_value, member_id in
+                self._order.slice(start, start + page_size)]
+
+
+    def first(self) -> Tuple[int, int]:
+        """Return the member id and value of the member with the highest
+        value, or None if there are no members."""
+        if not self._order:
+            return None
+        neg_value, member_id = self._order[0]
+        return member_id, -neg_value
+
+
+    def last(self) -> Tuple[int, int]:
+        """Return the member id and value of the member with the lowest
+        value, or None if there are no members."""
+        if not self._order:
+            return None
+        neg_value, member_id = self._order[-1]
+        return member_id, -neg_value
+
+
+
+class GuildStandings:
+    def __init__(self, member_data:Dict[int, dict]=None):
+        """Init for the GuildStandings object.
+        The purpose of this object is to know how the human members of a
+        guild rank, by points and by cancel counter, without looking at every
+        member. This includes who has the most and the least points, and so
+        who the favorite and hated child are.
+
+        Parameters
+        ----------
+        member_data: Dict[int, dict]=None
+            The starting data of each member, keyed by member id.
+        """
+        member_data = member_data or dict()
+        self.points = Leaderboard({member_id: data["points"] for
+                member_id, data in member_data.items()})
+        self.cancel_counters = Leaderboard(
+                {member_id: data["cancel_counter"] for
+                    member_id, data in member_data.items()})
+
+
+    def remove(self, member_id:int) -> None:
+        """Remove a member, such as when they leave the guild.
+
+        Parameters
+        ----------
+        member_id: int
+            The id of the member.
+        """
+        self.points.remove(member_id)
+        self.cancel_counters.remove(member_id)
+
+
+    def favorite(self) -> int:
+        """Return the id of the member with the most points, if above 0."""
+        first = self.points.first()
+        if first is not None and first[1] > 0:
+            return first[0]
+        return None
+
+
+    def hated(self) -> int:
+        """Return the id of the member with the least points, if below 0."""
+        last = self.points.last()
+        if last is not None and last[1] < 0:
+            return last[0]
+        return None
+
+
+
+class Standings:
+    def __init__(self, points_ledger:PointsLedger):
+        """Init for the Standings object.
+        Holds the GuildStandings of every guild, loading each one from the
+        points ledger the first time it's needed.
+
+        Parameters
+        ----------
+        points_ledger: PointsLedger
+            The ledger to load the member data of each guild from.
+        """
+        self._points_ledger = points_ledger
+        self._guilds = dict()
+
+
+    async def get(self, guild:discord.Guild) -> GuildStandings:
+        """Return the standings of a guild.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to get the standings of.
+
+        Returns
+        -------
+        GuildStandings
+            The standings of the guild's human members.
+        """
+        try:
+            return self._guilds[guild.id]
+        except KeyError:
+            member_data = dict()
+            for member_id, data in \
+                    (await self._points_ledger.guild_member_data(guild))\
+                    .items():
+                member = guild.get_member(member_id)
+                if member is not None and not member.bot:
+                    member_data[member_id] = data
+            standings = self._guilds[guild.id] = GuildStandings(member_data)
+            return standings
+
+
+    def forget(self, guild:discord.Guild) -> None:
+        """Drop the standings of a guild.
+
+        Parameters
+        ----------
+        guild: discord.Guild
+            The guild to forget the standings of.
+        """
+        self._guilds.pop(guild.id, None)